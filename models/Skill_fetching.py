@@ -1,8 +1,5 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-import pandas as pd
-import numpy as np
-import faiss
 from sentence_transformers import SentenceTransformer
 import re
 import google.generativeai as genai
@@ -10,6 +7,10 @@ import PyPDF2
 import pathlib
 import os
 import json
+import threading
+import time
+from embedding_batcher import EmbeddingBatcher
+from skills_index import load_index, ingest_rows, current_version, SKILLS_INDEX_DIR, EMBEDDING_MODEL_NAME
 
 app = Flask(__name__)
 # Update CORS configuration to be more permissive
@@ -35,30 +36,97 @@ def clean_json_string(text):
         json_str = re.sub(r'```json|```', '', json_str)
         return json_str.strip()
     return None
-# Paths
-CSV_FILE_PATH = 'train.csv'
-FAISS_INDEX_PATH = 'faiss_index.bin'
-EMBEDDINGS_NPY_PATH = 'embeddings.npy'
+# Load everything in the master before forking workers (e.g. gunicorn --preload)
+# so they share the pages copy-on-write instead of each loading its own copy
+SKILLS_PRELOAD = os.environ.get("SKILLS_PRELOAD", "0") == "1"
 
-# 1. Load CSV (for accessing skills later)
-df = pd.read_csv(CSV_FILE_PATH)
+# Nearest rows whose skills are merged per query; 1 returns the single best row's skills
+SKILLS_TOP_K = int(os.environ.get("SKILLS_TOP_K", "1"))
+SKILLS_MAX_K = int(os.environ.get("SKILLS_MAX_K", "50"))
 
-# 2. Load FAISS index
-index = faiss.read_index(FAISS_INDEX_PATH)
+# How often each worker checks whether a newer index version has been published
+SKILLS_INDEX_RELOAD_SECONDS = float(os.environ.get("SKILLS_INDEX_RELOAD_SECONDS", "10"))
+SKILLS_INGEST_MAX_ROWS = int(os.environ.get("SKILLS_INGEST_MAX_ROWS", "10000"))
 
-# 3. Load model
-model = SentenceTransformer('all-MiniLM-L6-v2')
+# Loaded on first use, not at import
+_skills_index = None
+_index_checked_at = 0.0
+_model = None
+_load_lock = threading.Lock()
+_load_error = None
 
-def split_skills(text):
-    """Splits a string of skills into a list of individual skills."""
 
-    # Remove "ex" part
-    text = re.sub(r'\bex\b', '', text, flags=re.IGNORECASE)
+def get_skills_index():
+    """
+    The current skills index artifact (FAISS index plus pre-split skills per
+    row). Every SKILLS_INDEX_RELOAD_SECONDS one caller checks CURRENT and
+    swaps in a newly published version; requests keep using the old one
+    until the new one is fully loaded.
+    """
+    global _skills_index, _index_checked_at
+    if _skills_index is None:
+        with _load_lock:
+            if _skills_index is None:
+                _skills_index = load_index(SKILLS_INDEX_DIR)
+                _index_checked_at = time.monotonic()
+    elif time.monotonic() - _index_checked_at > SKILLS_INDEX_RELOAD_SECONDS and _load_lock.acquire(blocking=False):
+        try:
+            _index_checked_at = time.monotonic()
+            version = current_version(SKILLS_INDEX_DIR)
+            if version and version != _skills_index.version:
+                print(f"Loading skills index {version}")
+                _skills_index = load_index(SKILLS_INDEX_DIR)
+        except Exception as e:
+            print(f"Error reloading skills index, keeping {_skills_index.version}: {str(e)}")
+        finally:
+            _load_lock.release()
+    return _skills_index
+
+
+def get_model():
+    """SentenceTransformer used to embed queries."""
+    global _model
+    if _model is None:
+        with _load_lock:
+            if _model is None:
+                _model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+    return _model
+
+
+# Concurrent /get_skills queries share one encode call; repeated titles skip the model
+embedding_batcher = EmbeddingBatcher(get_model)
+
+
+def is_ready():
+    return _skills_index is not None and _model is not None
 
-    # Split based on capital letters and commas
-    skills = re.findall(r'[A-Z][a-z]+(?:\s+[a-z]+)*|[A-Z]+', text)
 
-    return skills
+def preload_models():
+    """Load the skills index and model; records the error instead of raising."""
+    global _load_error
+    try:
+        get_skills_index()
+        get_model()
+        _load_error = None
+    except Exception as e:
+        _load_error = str(e)
+        print(f"Error loading skill retrieval models: {_load_error}")
+
+
+if SKILLS_PRELOAD:
+    preload_models()
+
+
+def int_param(data, name, default=None):
+    """Integer request field, or `default` when absent or null; ValueError on anything else."""
+    value = data.get(name)
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"'{name}' must be an integer")
+
 
 @app.route('/get_skills', methods=['POST', 'OPTIONS'])
 def get_skills():
@@ -76,32 +144,29 @@ def get_skills():
             }), 400
             
         user_input = data['text']
+        try:
+            k = max(1, min(int_param(data, 'k', SKILLS_TOP_K), SKILLS_MAX_K))
+            limit = int_param(data, 'limit')
+        except ValueError as e:
+            return jsonify({"status": "error", "message": str(e), "skills": []}), 400
+        if limit is not None:
+            limit = max(1, limit)
         
         # Encode user input
-        query_embedding = model.encode([user_input]).astype('float32')
-        
-        # Search FAISS index
-        k = 1  # Top result
-        distances, indices = index.search(query_embedding, k)
-        
-        # Collect skills from matched rows
-        skills_list = []
-        for idx in indices[0]:
-            if idx < len(df):  # Check if valid index
-                skills = df.iloc[idx]['skills']
-                skills_list.append(skills)
+        query_embedding = embedding_batcher.encode(user_input).reshape(1, -1)
         
-        # Process skills
-        result = []
-        for skills_text in skills_list:
-            individual_skills = split_skills(skills_text)
-            result.extend(individual_skills)
+        # Search FAISS index and merge the pre-split skills of the matched rows, weighted by distance
+        skills_index = get_skills_index()
+        result, scores = skills_index.search(query_embedding, k, limit)
         
         return jsonify({
             "status": "success",
             "message": "Skills fetched successfully",
             "input": user_input,
-            "skills": result
+            "k": k,
+            "index_version": skills_index.version,
+            "skills": result,
+            "scores": scores
         })
         
     except Exception as e:
@@ -111,6 +176,52 @@ def get_skills():
             "skills": []
         }), 500
 
+@app.route('/ready', methods=['GET'])
+def ready():
+    """Readiness probe: 503 until this worker has its models loaded, which a probe starts."""
+    if is_ready():
+        return jsonify({"status": "ready"})
+    if not _load_lock.locked():
+        threading.Thread(target=preload_models, daemon=True).start()
+    body = {"status": "loading"}
+    if _load_error:
+        body = {"status": "error", "error": _load_error}
+    return jsonify(body), 503
+
+@app.route('/ingest', methods=['POST'])
+def ingest():
+    """Append job postings to the skills index; workers switch to the new version on their next check."""
+    global _skills_index
+    try:
+        data = request.get_json()
+        rows = data.get('rows') if data else None
+        if not isinstance(rows, list) or not rows or not all(isinstance(row, dict) for row in rows):
+            return jsonify({"status": "error", "message": "A non-empty list of row objects is required"}), 400
+        if len(rows) > SKILLS_INGEST_MAX_ROWS:
+            return jsonify({
+                "status": "error",
+                "message": f"At most {SKILLS_INGEST_MAX_ROWS} rows can be ingested per request"
+            }), 400
+
+        version = ingest_rows(rows, SKILLS_INDEX_DIR, model=get_model())
+        with _load_lock:
+            _skills_index = load_index(SKILLS_INDEX_DIR)
+        return jsonify({
+            "status": "success",
+            "version": version,
+            "ingested": len(rows),
+            "rows": _skills_index.manifest.get("rows")
+        })
+
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return jsonify({"embedding_batcher": embedding_batcher.metrics()})
+
 RESUME_TEMPLATE = {
     "personal_details": {
         "full_name": "", "username": "", "phone_number": "", "email_address": "",
@@ -1,6 +1,9 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, send_file, Response
 from flask_cors import CORS
 import os
+import io
+import re
+import time
 from dotenv import load_dotenv
 import base64
 import json
@@ -8,14 +11,31 @@ import PyPDF2
 import pathlib
 import google.generativeai as genai
 from groq import Groq
-from convert_latex import generate_latex_file, convert_tex_to_pdf
+from convert_latex import generate_latex_file, get_skills_batch, SKILLS_BATCH_MAX_ITEMS
 from Skill_fetching import clean_json_string
-from prompt_templates import ATS_PROMPT_TEMPLATE
+from prompt_templates import ATS_PROMPT_TEMPLATE, LATEX_RESUME_TEMPLATE
+from latex_build import init_preamble_format
+from compile_service import compile_service, CompileQueueFull, CompileTimeout, LATEX_RETRY_AFTER, LATEX_QUEUE_WAIT
+import llama_pool
+import skills_cache
+import pdf_cache
+from jobs import job_manager, JobQueueFull
+from latex_stream import generate_latex_streaming, GEMINI_STREAMING
+from prompt_compaction import PROMPT_COMPACTION, strip_latex_comments, prompt_stats
+from latex_sections import (
+    split_sections, find_target_sections, environments_balanced, parse_section_fragments,
+    splice_sections, split_trailer
+)
+from ats_local import (
+    calculate_local_ats_score, score_resume_batch, ats_cache, ats_cache_key, ATS_ENGINE, ATS_ENGINES,
+    ATS_BATCH_MAX_JOBS
+)
+import ats_local
 
 load_dotenv()
 
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=['X-Resume-Id', 'X-Compile-Passes', 'X-Compile-Cached'])
 
 # Initialize Gemini
 gemini_api_key = os.environ['GEMINI_API_KEY']
@@ -26,6 +46,44 @@ model_gemini = genai.GenerativeModel('gemini-2.5-flash-preview-04-17')
 groq_api_key = os.environ['GROQ_API_KEY']
 groq_client = Groq(api_key=groq_api_key)
 
+def compile_busy_response(message):
+    """429 returned when the LaTeX compile queue is saturated."""
+    response = jsonify({"error": message, "status": "error"})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(LATEX_RETRY_AFTER)
+    return response
+
+RESUME_ID_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+def wants_pdf_response():
+    """True when the client asked for the PDF as the response body instead of base64 JSON."""
+    if request.args.get('format') == 'pdf':
+        return True
+    return request.accept_mimetypes.best == 'application/pdf'
+
+def stored_resume_id(compile_result):
+    """ID under which /resume/<id>/... can serve this PDF, or None if it is not in the cache."""
+    cache = pdf_cache.pdf_cache
+    if cache and compile_result.source_key and cache.contains(compile_result.source_key):
+        return compile_result.source_key
+    return None
+
+def pdf_response(compile_result):
+    """Stream a compiled PDF as application/pdf, with the ID for fetching its LaTeX when it is cached."""
+    resume_id = stored_resume_id(compile_result)
+    if resume_id:
+        response = send_file(pdf_cache.pdf_cache.path_for(resume_id), mimetype='application/pdf',
+                             conditional=True, download_name='resume.pdf')
+        response.headers['X-Resume-Id'] = resume_id
+    else:
+        response = send_file(io.BytesIO(compile_result.pdf_data), mimetype='application/pdf', download_name='resume.pdf')
+    response.headers['X-Compile-Passes'] = str(compile_result.passes)
+    response.headers['X-Compile-Cached'] = str(compile_result.cached).lower()
+    return response
+
+# Precompile the resume template preamble once so each compile skips package loading
+init_preamble_format(LATEX_RESUME_TEMPLATE)
+
 @app.route('/api/upload-resume', methods=['POST'])
 def upload_resume():
     if 'file' not in request.files:
@@ -152,32 +210,169 @@ def generate_resume():
         if not job_details:
             return jsonify({"error": "Job details are required"}), 400
         
-        # Generate LaTeX code
-        latex_code = generate_latex_file(job_description=job_details, profile=profile, resume=resume)
+        # Turn the request away before any model calls if the compiler is saturated
+        if not compile_service.has_capacity():
+            return compile_busy_response("LaTeX compiler is busy, please retry shortly")
         
-        # Save LaTeX to file
-        tex_file_path = "my_resume.tex"
-        with open(tex_file_path, "w") as f:
-            f.write(latex_code)
+        # Generate LaTeX code
+        timings = {}
+        prompt_report = {}
+        latex_code = generate_latex_file(job_description=job_details, profile=profile, resume=resume,
+                                         timings=timings, prompt_report=prompt_report)
         
-        # Convert to PDF
-        if convert_tex_to_pdf(tex_file_path):
-            # Read the generated PDF
-            pdf_path = tex_file_path.replace('.tex', '.pdf')
-            with open(pdf_path, 'rb') as pdf_file:
-                pdf_data = base64.b64encode(pdf_file.read()).decode('utf-8')
+        # Convert to PDF on the bounded compile pool, in a private build directory
+        compile_start = time.perf_counter()
+        compile_result = compile_service.compile(latex_code)
+        timings["compile"] = round(time.perf_counter() - compile_start, 4)
+        print(f"generate_resume timings: {timings}")
+        if compile_result:
+            # Binary mode: stream the PDF, LaTeX is fetched by ID from /resume/<id>/latex
+            if wants_pdf_response():
+                return pdf_response(compile_result)
+
+            pdf_data = base64.b64encode(compile_result.pdf_data).decode('utf-8')
             
             # Return both PDF and LaTeX code
             return jsonify({
+                "resume_id": stored_resume_id(compile_result),
                 "pdf": pdf_data,
-                "latex_code": latex_code
+                "latex_code": latex_code,
+                "compile_passes": compile_result.passes,
+                "compile_cached": compile_result.cached,
+                "timings": timings,
+                "prompt_stats": prompt_report
             })
         else:
+            print(f"Error during compilation: {compile_result.output}")
             return jsonify({"error": "Failed to generate PDF"}), 500
     
+    except CompileQueueFull as e:
+        return compile_busy_response(str(e))
+    except CompileTimeout as e:
+        return jsonify({"error": str(e)}), 504
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def run_generate_job(job_details, profile, resume, progress, attach):
+    """
+    Background version of /generate_resume. The PDF is kept with the job, so
+    it stays downloadable until the job expires even if the PDF cache drops it.
+    """
+    timings = {}
+    prompt_report = {}
+    latex_code = generate_latex_file(job_description=job_details, profile=profile, resume=resume,
+                                     progress=progress, timings=timings, prompt_report=prompt_report)
+
+    # The generation is already paid for, so wait for a compile slot rather than fail on a full queue
+    progress("compile")
+    compile_start = time.perf_counter()
+    compile_result = compile_service.compile(latex_code, wait=LATEX_QUEUE_WAIT)
+    timings["compile"] = round(time.perf_counter() - compile_start, 4)
+    if not compile_result or not compile_result.pdf_data:
+        print(f"Error during compilation: {compile_result.output}")
+        raise Exception("Failed to generate PDF")
+
+    return {
+        "resume_id": stored_resume_id(compile_result),
+        "latex_code": latex_code,
+        "compile_passes": compile_result.passes,
+        "compile_cached": compile_result.cached,
+        "timings": timings,
+        "prompt_stats": prompt_report,
+        "pdf_url": attach("pdf", compile_result.pdf_data, "application/pdf"),
+        "latex_url": attach("latex", latex_code.encode('utf-8'), "application/x-tex")
+    }
+
+@app.route('/jobs/generate_resume', methods=['POST'])
+def submit_generate_job():
+    try:
+        data = request.get_json()
+        # Remove profilePhoto from profile if it exists
+        if data and 'profile' in data and data['profile'] and 'profilePhoto' in data['profile']:
+            del data['profile']['profilePhoto']
+
+        job_details = data.get('jobDetails') if data else None
+        if not job_details:
+            return jsonify({"error": "Job details are required", "status": "error"}), 400
+
+        job = job_manager.submit(
+            "generate_resume", run_generate_job,
+            job_details, data.get('profile'), data.get('resume')
+        )
+        return jsonify({
+            "status": "accepted",
+            "job_id": job.id,
+            "status_url": f"/jobs/{job.id}",
+            "events_url": f"/jobs/{job.id}/events"
+        }), 202
+
+    except JobQueueFull as e:
+        return compile_busy_response(str(e))
+    except Exception as e:
+        return jsonify({"error": str(e), "status": "error"}), 500
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found", "status": "error"}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/<job_id>/artifacts/<name>', methods=['GET'])
+def get_job_artifact(job_id, name):
+    job = job_manager.get(job_id)
+    artifact = job.artifact(name) if job else None
+    if artifact is None:
+        return jsonify({"error": "Artifact not found", "status": "error"}), 404
+    data, mimetype = artifact
+    return send_file(io.BytesIO(data), mimetype=mimetype)
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def stream_job_events(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found", "status": "error"}), 404
+
+    def event_stream():
+        for event in job.iter_events():
+            if event is None:
+                yield ": keep-alive\n\n"
+            else:
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+    return Response(event_stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/batch_skills', methods=['POST'])
+def batch_skills():
+    try:
+        data = request.get_json()
+        jobs = data.get('jobs') if data else None
+
+        # Validate required data
+        if not isinstance(jobs, list) or not jobs:
+            return jsonify({"error": "A non-empty list of jobs is required", "status": "error"}), 400
+        if len(jobs) > SKILLS_BATCH_MAX_ITEMS:
+            return jsonify({
+                "error": f"At most {SKILLS_BATCH_MAX_ITEMS} jobs can be processed per batch",
+                "status": "error"
+            }), 400
+
+        results = get_skills_batch(jobs)
+        for index, result in enumerate(results):
+            result["index"] = index
+
+        return jsonify({
+            "status": "success",
+            "results": results,
+            "failed": sum(1 for result in results if "error" in result)
+        })
+
+    except Exception as e:
+        return jsonify({"error": str(e), "status": "error"}), 500
+
 @app.route('/process', methods=['POST'])
 def process_query():
     try:
@@ -232,6 +427,49 @@ def preprocess_latex_code(latex_code: str) -> str:
     except Exception as e:
         return None
 
+def modify_resume_sections(query, latex_code):
+    """
+    Send only the sections a request is about to Gemini and splice the result
+    back in. Returns (modified_latex, edited_sections, prompt_stats);
+    modified_latex is None when the request is not section-specific or the
+    returned fragments are unusable.
+    """
+    _, sections, _ = split_sections(latex_code)
+    targets = find_target_sections(query, [title for title, _ in sections])
+    if not targets:
+        return None, [], None
+
+    originals = dict(sections)
+    fragments = "\n\n".join(split_trailer(originals[title])[0].strip() for title in targets)
+    if PROMPT_COMPACTION:
+        fragments = strip_latex_comments(fragments)
+
+    prompt = f"""
+        As a LaTeX expert, modify the following resume section(s) according to: "{query}"
+        
+        Requirements:
+        1. Return ONLY the section(s) below, in the same order, each starting with its original \\section line
+        2. Keep the section titles exactly as they are
+        3. Keep all existing formatting commands and environments
+        4. Only modify content as requested, not the structure
+        5. Ensure all environments are properly closed
+        6. Do not return the preamble, other sections or \\end{{document}}
+        
+        Sections to modify:
+        {fragments}
+        """
+    stats = prompt_stats(prompt, model=model_gemini)
+
+    returned = parse_section_fragments(model_gemini.generate_content(prompt).text)
+    if set(returned) != set(targets):
+        print(f"Section edit returned {list(returned)} instead of {targets}")
+        return None, targets, stats
+    if not all(environments_balanced(returned[title]) for title in targets):
+        print("Section edit returned unbalanced environments")
+        return None, targets, stats
+
+    return splice_sections(latex_code, returned), targets, stats
+
 @app.route('/modify-resume', methods=['POST'])
 def modify_resume():
     try:
@@ -245,97 +483,126 @@ def modify_resume():
                 'status': 'error'
             }), 400
 
-        # Create prompt for Gemini with specific LaTeX requirements
-        prompt = f"""
-        As a LaTeX expert, modify this resume according to: "{query}"
-        
-        Requirements:
-        1. Preserve all document structure and package imports
-        2. Keep all existing formatting commands and environments
-        3. Maintain document class and style definitions
-        4. Only modify content as requested, not the structure
-        5. Ensure all environments are properly closed
-        6. Return complete, compilable LaTeX code
-        7. Keep all necessary package imports
-        8. Preserve any custom commands or definitions
-        
-        Original LaTeX code:
-        {latex_code}
-        """
+        # Turn the request away before calling Gemini if the compiler is saturated
+        if not compile_service.has_capacity():
+            return compile_busy_response("LaTeX compiler is busy, please retry shortly")
 
-        # Generate modified LaTeX using Gemini
-        response = model_gemini.generate_content(prompt)
-        modified_latex = response.text.strip()
+        # "section" edits only the sections the query names, "full" regenerates the
+        # whole document, "auto" tries sections first and falls back to full
+        mode = data.get('mode', 'auto')
+        if mode not in ('auto', 'section', 'full'):
+            return jsonify({
+                'error': "Mode must be one of 'auto', 'section' or 'full'",
+                'status': 'error'
+            }), 400
+
+        modified_latex = None
+        edited_sections = []
+        if mode != 'full':
+            try:
+                modified_latex, edited_sections, modify_prompt_stats = modify_resume_sections(query, latex_code)
+            except Exception as e:
+                # A failed section edit is one more reason to fall back in auto mode
+                if mode != 'auto':
+                    raise
+                print(f"Section edit failed, regenerating the full document: {str(e)}")
+                modified_latex = None
+            if modified_latex is None and mode == 'section':
+                raise Exception("Could not apply the modification to individual sections")
+
+        if modified_latex is None:
+            edited_sections = []
+            # Create prompt for Gemini with specific LaTeX requirements
+            prompt = f"""
+            As a LaTeX expert, modify this resume according to: "{query}"
+            
+            Requirements:
+            1. Preserve all document structure and package imports
+            2. Keep all existing formatting commands and environments
+            3. Maintain document class and style definitions
+            4. Only modify content as requested, not the structure
+            5. Ensure all environments are properly closed
+            6. Return complete, compilable LaTeX code
+            7. Keep all necessary package imports
+            8. Preserve any custom commands or definitions
+            
+            Original LaTeX code:
+            {strip_latex_comments(latex_code) if PROMPT_COMPACTION else latex_code}
+            """
+            modify_prompt_stats = prompt_stats(prompt, model=model_gemini)
+
+            # Generate modified LaTeX using Gemini, aborting early on malformed output
+            if GEMINI_STREAMING:
+                modified_latex, _ = generate_latex_streaming(model_gemini, prompt)
+            else:
+                modified_latex = model_gemini.generate_content(prompt).text
+        modified_latex = modified_latex.strip()
         
         # Preprocess and validate LaTeX code
         processed_latex = preprocess_latex_code(modified_latex)
         if not processed_latex:
             raise Exception("Generated LaTeX code is invalid or incomplete")
         
-        # Create a temporary directory for compilation
-        import tempfile
-        import shutil
-        
-        temp_dir = tempfile.mkdtemp()
-        temp_tex_path = os.path.join(temp_dir, "temp_modified.tex")
+        # Compile on the bounded compile pool, in a private build directory
+        compile_result = compile_service.compile(processed_latex, jobname="temp_modified")
+        if not compile_result:
+            raise Exception(f"LaTeX compilation failed: {compile_result.output}")
+
+        # Binary mode: stream the PDF, LaTeX is fetched by ID from /resume/<id>/latex
+        if wants_pdf_response():
+            return pdf_response(compile_result)
+
+        pdf_data = base64.b64encode(compile_result.pdf_data).decode('utf-8')
         
-        try:
-            # Save LaTeX to temp file
-            with open(temp_tex_path, "w", encoding='utf-8') as f:
-                f.write(processed_latex)
-            
-            # Compile LaTeX with enhanced error handling
-            success = False
-            compile_output = ""
-            for attempt in range(2):  # Try twice
-                try:
-                    import subprocess
-                    process = subprocess.run(
-                        ['pdflatex', '-interaction=nonstopmode', temp_tex_path],
-                        cwd=temp_dir,
-                        capture_output=True,
-                        text=True,
-                        timeout=30
-                    )
-                    compile_output = process.stdout + "\n" + process.stderr
-                    if process.returncode == 0:
-                        success = True
-                        break
-                except Exception as e:
-                    compile_output += f"\nError: {str(e)}"
-
-            if not success:
-                raise Exception(f"LaTeX compilation failed: {compile_output}")
-
-            # Verify PDF was generated
-            pdf_path = temp_tex_path.replace('.tex', '.pdf')
-            if not os.path.exists(pdf_path):
-                raise Exception("PDF file was not generated")
-
-            # Read the generated PDF
-            with open(pdf_path, 'rb') as pdf_file:
-                pdf_data = base64.b64encode(pdf_file.read()).decode('utf-8')
-            
-            return jsonify({
-                'status': 'success',
-                'pdf': pdf_data,
-                'latex_code': processed_latex
-            })
-                
-        finally:
-            # Clean up temp directory
-            try:
-                shutil.rmtree(temp_dir)
-            except Exception as e:
-                # Consider how to handle this error if logging is removed
-                pass
+        return jsonify({
+            'status': 'success',
+            'resume_id': stored_resume_id(compile_result),
+            'pdf': pdf_data,
+            'latex_code': processed_latex,
+            'compile_passes': compile_result.passes,
+            'compile_cached': compile_result.cached,
+            'prompt_stats': modify_prompt_stats,
+            'edit_mode': 'section' if edited_sections else 'full',
+            'edited_sections': edited_sections
+        })
 
+    except CompileQueueFull as e:
+        return compile_busy_response(str(e))
+    except CompileTimeout as e:
+        return jsonify({
+            'error': str(e),
+            'status': 'error'
+        }), 504
     except Exception as e:
         return jsonify({
             'error': str(e),
             'status': 'error'
         }), 500
 
+@app.route('/resume/<resume_id>/pdf', methods=['GET'])
+def get_resume_pdf(resume_id):
+    cache = pdf_cache.pdf_cache
+    if not RESUME_ID_PATTERN.match(resume_id) or not cache or not cache.contains(resume_id):
+        return jsonify({'error': 'Resume not found', 'status': 'error'}), 404
+    try:
+        # conditional=True gives ETag/Last-Modified and HTTP range support
+        return send_file(cache.path_for(resume_id), mimetype='application/pdf',
+                         conditional=True, download_name='resume.pdf')
+    except FileNotFoundError:
+        return jsonify({'error': 'Resume not found', 'status': 'error'}), 404
+
+@app.route('/resume/<resume_id>/latex', methods=['GET'])
+def get_resume_latex(resume_id):
+    cache = pdf_cache.pdf_cache
+    latex_code = cache.get_latex(resume_id) if cache and RESUME_ID_PATTERN.match(resume_id) else None
+    if latex_code is None:
+        return jsonify({'error': 'Resume not found', 'status': 'error'}), 404
+    return jsonify({
+        'status': 'success',
+        'resume_id': resume_id,
+        'latex_code': latex_code
+    })
+
 @app.route('/calculate-ats-score', methods=['POST'])
 def calculate_ats_score():
     try:
@@ -356,6 +623,33 @@ def calculate_ats_score():
         if not latex_code:
             print("Error: Missing LaTeX code")
             return jsonify({"error": "Resume LaTeX code is required"}), 400
+
+        engine = data.get('engine', ATS_ENGINE)
+        if engine not in ATS_ENGINES:
+            return jsonify({
+                "error": f"engine must be one of: {', '.join(ATS_ENGINES)}",
+                "status": "error"
+            }), 400
+
+        # Unchanged content (ignoring formatting) scored with the same engine is served from memory
+        cache_key = ats_cache_key(latex_code, job_details, engine)
+        cached = ats_cache.get(cache_key)
+        if cached is not None:
+            return jsonify({**cached, "cache": "hit"})
+
+        # The local scorer applies the same criteria deterministically without an LLM call;
+        # "hybrid" also asks the LLM and returns both scores
+        local_score = None
+        if engine in ('local', 'hybrid'):
+            local_score = calculate_local_ats_score(latex_code, job_details)
+            if engine == 'local':
+                response = {
+                    "status": "success",
+                    "ats_score": local_score,
+                    "engine": engine
+                }
+                ats_cache.put(cache_key, response)
+                return jsonify({**response, "cache": "miss"})
         
         # Format the ATS prompt template with job details and resume
         try:
@@ -409,10 +703,15 @@ def calculate_ats_score():
             ats_score_data = json.loads(response_content)
             print("Successfully parsed JSON response")
             print(f"ATS score data structure: {list(ats_score_data.keys())}")
-            return jsonify({
+            response = {
                 "status": "success",
-                "ats_score": ats_score_data
-            })
+                "ats_score": ats_score_data,
+                "engine": engine
+            }
+            if local_score is not None:
+                response["local_score"] = local_score
+            ats_cache.put(cache_key, response)
+            return jsonify({**response, "cache": "miss"})
         except json.JSONDecodeError as json_error:
             print(f"JSON parse error: {json_error}, raw content: {response_content[:200]}...")
             return jsonify({
@@ -430,6 +729,44 @@ def calculate_ats_score():
             "status": "error"
         }), 500
 
+@app.route('/batch-ats-score', methods=['POST'])
+def batch_ats_score():
+    try:
+        data = request.get_json()
+        jobs = data.get('jobs') if data else None
+        latex_code = data.get('latexCode') if data else None
+
+        # Validate required data
+        if not latex_code:
+            return jsonify({"error": "Resume LaTeX code is required", "status": "error"}), 400
+        if not isinstance(jobs, list) or not jobs:
+            return jsonify({"error": "A non-empty list of jobs is required", "status": "error"}), 400
+        if len(jobs) > ATS_BATCH_MAX_JOBS:
+            return jsonify({
+                "error": f"At most {ATS_BATCH_MAX_JOBS} jobs can be scored per batch",
+                "status": "error"
+            }), 400
+
+        ranking = score_resume_batch(latex_code, jobs)
+        return jsonify({
+            "status": "success",
+            "ranking": ranking,
+            "failed": sum(1 for result in ranking if "error" in result)
+        })
+
+    except Exception as e:
+        return jsonify({"error": str(e), "status": "error"}), 500
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return jsonify({
+        "llama_pool": llama_pool.get_metrics(),
+        "skills_cache": skills_cache.get_metrics(),
+        "compile_service": compile_service.metrics(),
+        "pdf_cache": pdf_cache.get_metrics(),
+        "ats_cache": ats_local.get_cache_metrics()
+    })
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=8080)
 
@@ -0,0 +1,440 @@
+import hashlib
+import json
+import os
+import re
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+
+from latex_sections import split_sections
+from memo_cache import TTLCache
+
+# Local, deterministic implementation of the ATS_PROMPT_TEMPLATE scoring criteria
+ATS_ENGINES = ("local", "llm", "hybrid")
+ATS_ENGINE = os.environ.get("ATS_ENGINE", "local")
+ATS_USE_EMBEDDINGS = os.environ.get("ATS_USE_EMBEDDINGS", "1") == "1"
+ATS_SYNONYM_THRESHOLD = float(os.environ.get("ATS_SYNONYM_THRESHOLD", "0.75"))
+ATS_MAX_KEYWORDS = int(os.environ.get("ATS_MAX_KEYWORDS", "40"))
+ATS_BATCH_WORKERS = int(os.environ.get("ATS_BATCH_WORKERS", "4"))
+ATS_BATCH_MAX_JOBS = int(os.environ.get("ATS_BATCH_MAX_JOBS", "100"))
+ATS_CACHE_MAX_ENTRIES = int(os.environ.get("ATS_CACHE_MAX_ENTRIES", "1024"))
+ATS_CACHE_TTL = float(os.environ.get("ATS_CACHE_TTL", "3600"))
+ATS_TERM_EMBEDDING_MAX_ENTRIES = int(os.environ.get("ATS_TERM_EMBEDDING_MAX_ENTRIES", "20000"))
+# Bump when the scoring rules change so stale scores are not served
+ATS_CACHE_VERSION = "2"
+
+STOPWORDS = {
+    "a", "about", "above", "across", "after", "all", "also", "an", "and", "any", "are", "as", "at", "be",
+    "been", "being", "both", "but", "by", "can", "could", "do", "does", "each", "etc", "for", "from", "has",
+    "have", "how", "if", "in", "into", "is", "it", "its", "may", "more", "most", "must", "not", "of", "on",
+    "or", "other", "our", "out", "over", "own", "per", "should", "so", "such", "than", "that", "the",
+    "their", "them", "then", "there", "these", "they", "this", "those", "through", "to", "under", "up",
+    "use", "used", "using", "via", "was", "we", "well", "were", "what", "when", "where", "which", "while",
+    "who", "will", "with", "within", "without", "would", "you", "your",
+    # Generic job-posting vocabulary that carries no skill signal
+    "ability", "able", "candidate", "company", "description", "duties", "ensure", "ensuring", "excellent",
+    "experience", "good", "help", "ideal", "including", "job", "join", "knowledge", "looking", "make",
+    "manage", "new", "plus", "preferred", "related", "required", "requirements", "responsibilities",
+    "responsible", "role", "skills", "strong", "team", "title", "understanding", "various", "work",
+    "working", "year", "years",
+}
+
+# Capitalized only because they open a sentence in a job posting
+SENTENCE_OPENERS = {
+    "analyze", "assist", "bachelor", "build", "collaborate", "contribute", "create", "define", "deliver",
+    "design", "develop", "drive", "familiarity", "identify", "implement", "improve", "lead", "maintain",
+    "minimum", "monitor", "need", "own", "participate", "partner", "proficiency", "proven", "provide",
+    "support", "test", "troubleshoot", "write",
+}
+
+SOFT_SKILLS = (
+    "communication", "teamwork", "collaboration", "leadership", "problem solving", "adaptability",
+    "time management", "critical thinking", "creativity", "attention to detail", "ownership",
+    "mentoring", "stakeholder", "presentation", "negotiation", "analytical", "organization",
+    "self-motivated", "interpersonal", "decision making",
+)
+DEFAULT_SOFT_SKILLS = ("communication", "teamwork", "problem solving")
+
+DEGREE_LEVELS = (
+    (3, re.compile(r"\bph\.?\s?d\b|\bdoctor", re.I)),
+    (2, re.compile(r"\bmaster|\bm\.?\s?tech\b|\bm\.?s\.?c?\b|\bmba\b|\bm\.?e\.?\b", re.I)),
+    (1, re.compile(r"\bbachelor|\bb\.?\s?tech\b|\bb\.?s\.?c?\b|\bb\.?e\.?\b|\bundergraduate|\bdegree\b", re.I)),
+)
+
+OPTIONAL_HINTS = re.compile(r"preferred|nice to have|good to have|bonus|optional|desirable|a plus", re.I)
+YEARS_REQUIRED_PATTERN = re.compile(r"(\d+)\s*\+?\s*(?:-\s*\d+\s*)?years?", re.I)
+DATE_RANGE_PATTERN = re.compile(
+    r"(?:[A-Za-z]+\.?\s+)?(\d{4})\s*(?:--|-|–|to)\s*(?:(?:[A-Za-z]+\.?\s+)?(\d{4})|(present|current|now))",
+    re.I
+)
+TOKEN_PATTERN = re.compile(r"[a-z][a-z0-9+#]*(?:[.\-/][a-z0-9+#]+)*")
+SKILL_WORD_PATTERN = re.compile(r"[A-Za-z][A-Za-z0-9+#]*(?:\.[A-Za-z0-9]+)*[+#]*")
+SENTENCE_SPLIT = re.compile(r"(?<=[.!?;\n])\s+")
+
+
+def _current_year():
+    import datetime
+    return datetime.date.today().year
+
+
+def tokenize(text):
+    return [token.strip('.-/') for token in TOKEN_PATTERN.findall(text.lower())]
+
+
+def content_terms(text):
+    """Unigrams and adjacent-word bigrams of a text, without stopwords."""
+    tokens = tokenize(text)
+    terms = {token for token in tokens if token not in STOPWORDS and len(token) > 1}
+    for first, second in zip(tokens, tokens[1:]):
+        if first not in STOPWORDS and second not in STOPWORDS:
+            terms.add(f"{first} {second}")
+    return terms
+
+
+def command_args(latex_code, command, count):
+    """Brace-balanced arguments of every use of `\\command`, as lists of `count` strings."""
+    results = []
+    for match in re.finditer(r"\\" + command + r"(?![A-Za-z])", latex_code):
+        position = match.end()
+        args = []
+        while len(args) < count:
+            while position < len(latex_code) and latex_code[position].isspace():
+                position += 1
+            if position >= len(latex_code) or latex_code[position] != '{':
+                break
+            depth, start = 0, position
+            while position < len(latex_code):
+                char = latex_code[position]
+                if char == '\\':
+                    position += 2
+                    continue
+                if char == '{':
+                    depth += 1
+                elif char == '}':
+                    depth -= 1
+                    if depth == 0:
+                        break
+                position += 1
+            args.append(latex_code[start + 1:position])
+            position += 1
+        if len(args) == count:
+            results.append(args)
+    return results
+
+
+def latex_to_text(latex_code):
+    """Plain text of a LaTeX fragment: comments, environments and command names removed."""
+    text = re.sub(r"(?<!\\)%.*", "", latex_code)
+    text = re.sub(r"\\(?:begin|end)\{[^}]*\}(?:\[[^\]]*\])?(?:\{[^}]*\})?", " ", text)
+    text = text.replace('\\&', '&').replace('\\%', '%').replace('\\$', '$').replace('\\#', '#').replace('\\_', '_')
+    text = re.sub(r"\\[A-Za-z]+\*?(?:\[[^\]]*\])?", " ", text)
+    text = re.sub(r"[{}\\]", " ", text)
+    text = text.replace('--', '-').replace('~', ' ')
+    return " ".join(text.split())
+
+
+def degree_level(text):
+    for level, pattern in DEGREE_LEVELS:
+        if pattern.search(text):
+            return level
+    return 0
+
+
+def experience_years(date_texts):
+    """Total years covered by date ranges such as 'July 2024--Present'."""
+    years = 0.0
+    for text in date_texts:
+        for start, end, ongoing in DATE_RANGE_PATTERN.findall(text):
+            end_year = _current_year() if ongoing else int(end)
+            years += max(0, end_year - int(start))
+    return years
+
+
+@dataclass
+class ParsedResume:
+    """Everything the scorer needs from one resume, extracted once and reusable across jobs."""
+    text: str
+    terms: set
+    experience_titles: list
+    experience_bullets: list
+    experience_years: float
+    projects: list
+    courses: list
+    degree_level: int
+
+
+def parse_resume(latex_code):
+    """Extract plain text, terms and per-section facts from a LaTeX resume."""
+    _, sections, _ = split_sections(latex_code)
+
+    experience_titles, experience_bullets, experience_dates = [], [], []
+    projects, courses = [], []
+    education_text = ""
+    for title, section in sections:
+        title_lower = title.lower()
+        if "experience" in title_lower:
+            for role, company, _, dates in command_args(section, "resumeSubheading", 4):
+                experience_titles.append(latex_to_text(role).lower())
+                experience_dates.append(dates)
+            experience_bullets.extend(
+                latex_to_text(item).lower() for item in re.findall(r"\\item\s+([^\n]+)", section)
+            )
+        elif "project" in title_lower:
+            projects.extend(latex_to_text(" ".join(args)).lower() for args in command_args(section, "resumeProject", 4))
+        elif "course" in title_lower or "certific" in title_lower:
+            courses.extend(latex_to_text(" ".join(args)).lower() for args in command_args(section, "resumePOR", 3))
+        elif "education" in title_lower:
+            education_text += latex_to_text(section) + " "
+
+    text = latex_to_text(latex_code.split('\\begin{document}', 1)[-1]).lower()
+    return ParsedResume(
+        text=text,
+        terms=content_terms(text),
+        experience_titles=experience_titles,
+        experience_bullets=experience_bullets,
+        experience_years=experience_years(experience_dates),
+        projects=projects,
+        courses=courses,
+        degree_level=degree_level(education_text),
+    )
+
+
+@dataclass
+class ParsedJob:
+    text: str
+    title_terms: set
+    keywords: list
+    required_skills: list
+    optional_skills: list
+    soft_skills: list
+    min_years: float
+    degree_level: int
+
+
+def job_text(job_details):
+    if isinstance(job_details, dict):
+        return "\n".join(
+            " ".join(map(str, value)) if isinstance(value, (list, tuple)) else str(value)
+            for value in job_details.values() if value
+        )
+    return str(job_details or "")
+
+
+def parse_job(job_details):
+    """Keywords, skills and requirements of a job description (dict or free text)."""
+    text = job_text(job_details)
+    lower = text.lower()
+
+    # Most frequent content words first, ties in order of appearance
+    counts = Counter(token for token in tokenize(text) if token not in STOPWORDS and len(token) > 2)
+    keywords = [token for token, _ in counts.most_common(ATS_MAX_KEYWORDS)]
+
+    title = ""
+    if isinstance(job_details, dict):
+        title = " ".join(str(job_details.get(key) or "") for key in ("job_title", "job_role", "jobTitle", "title"))
+    title_terms = {token for token in tokenize(title) if token not in STOPWORDS}
+
+    # Technical skills: capitalized or symbol-bearing words (Python, AWS, C++, Node.js).
+    # A sentence's first word is skipped if it is a common opener ("Develop ...");
+    # sentences saying "preferred", "a plus", ... list optional skills
+    required, optional = [], []
+    for sentence in SENTENCE_SPLIT.split(text):
+        bucket = optional if OPTIONAL_HINTS.search(sentence) else required
+        for index, word in enumerate(SKILL_WORD_PATTERN.findall(sentence)):
+            if not (word[0].isupper() or word[-1] in '+#'):
+                continue
+            skill = word.lower()
+            if index == 0 and skill in SENTENCE_OPENERS:
+                continue
+            if skill in STOPWORDS or skill in title_terms or degree_level(skill):
+                continue
+            if skill not in required and skill not in optional:
+                bucket.append(skill)
+    if not required:
+        required = keywords[:15]
+
+    years = [int(value) for value in YEARS_REQUIRED_PATTERN.findall(text)]
+    level = degree_level(text)
+
+    soft_skills = [skill for skill in SOFT_SKILLS if skill in lower][:5] or list(DEFAULT_SOFT_SKILLS)
+    return ParsedJob(
+        text=lower,
+        title_terms=title_terms,
+        keywords=keywords,
+        required_skills=required,
+        optional_skills=optional,
+        soft_skills=soft_skills,
+        min_years=min(years) if years else None,
+        degree_level=level or None,
+    )
+
+
+_embedding_model = None
+# Normalized embedding per term, shared by all resumes and jobs, so an edited
+# resume only encodes the terms it added
+term_embeddings = TTLCache(ATS_TERM_EMBEDDING_MAX_ENTRIES)
+
+
+def get_embedding_model():
+    """The MiniLM SentenceTransformer already loaded for skill retrieval."""
+    global _embedding_model
+    if _embedding_model is None:
+        from Skill_fetching import get_model
+        _embedding_model = get_model()
+    return _embedding_model
+
+
+def embed_terms(model, terms):
+    """Matrix of normalized embeddings, one row per term; only uncached terms are encoded."""
+    vectors = {term: term_embeddings.get(term) for term in terms}
+    missing = [term for term, vector in vectors.items() if vector is None]
+    if missing:
+        for term, vector in zip(missing, model.encode(missing, normalize_embeddings=True)):
+            term_embeddings.put(term, vector)
+            vectors[term] = vector
+    return np.stack([vectors[term] for term in terms])
+
+
+def match_terms(terms, resume, use_embeddings=ATS_USE_EMBEDDINGS):
+    """
+    Subset of `terms` found in the resume. Exact matches come from the term
+    index; the rest are matched by MiniLM cosine similarity against the
+    resume vocabulary, so close synonyms count too.
+    """
+    matched = {term for term in terms if term in resume.terms or _mentions(resume.text, term)}
+    missing = [term for term in terms if term not in matched]
+    if missing and use_embeddings and resume.terms:
+        model = get_embedding_model()
+        similarities = embed_terms(model, missing) @ embed_terms(model, sorted(resume.terms)).T
+        matched.update(term for term, best in zip(missing, similarities.max(axis=1)) if best >= ATS_SYNONYM_THRESHOLD)
+    return matched
+
+
+def _ratio(numerator, denominator):
+    return numerator / denominator if denominator else 0.0
+
+
+def _mentions(text, term):
+    """Whole-word occurrence of `term`, so "java" does not match "javascript"."""
+    return re.search(r"(?<![a-z0-9])" + re.escape(term) + r"(?![a-z0-9])", text) is not None
+
+
+def _mentions_any(text, terms):
+    return sum(1 for term in terms if _mentions(text, term))
+
+
+def score_resume(resume, job, use_embeddings=ATS_USE_EMBEDDINGS):
+    """Score a parsed resume against a parsed job; same JSON shape as the LLM scorer."""
+    # 1. Keyword match (30)
+    matched_keywords = match_terms(job.keywords, resume, use_embeddings)
+    keyword_match = _ratio(len(matched_keywords), len(job.keywords)) * 30
+
+    # 2. Work experience (25): title 5, years 5, bullet relevance 15
+    title_points = 0.0
+    if job.title_terms and any(
+        len(job.title_terms & set(tokenize(title))) * 2 >= len(job.title_terms) for title in resume.experience_titles
+    ):
+        title_points = 5.0
+    years_points = 0.0
+    if resume.experience_years and (job.min_years is None or resume.experience_years >= job.min_years):
+        years_points = 5.0
+    relevant_bullets = sum(1 for bullet in resume.experience_bullets if _mentions_any(bullet, matched_keywords))
+    work_experience = title_points + years_points + _ratio(relevant_bullets, len(resume.experience_bullets)) * 15
+
+    # 3. Technical skills (20): required ×16, optional ×4
+    required_ratio = _ratio(len(match_terms(job.required_skills, resume, use_embeddings)), len(job.required_skills))
+    if job.optional_skills:
+        optional_ratio = _ratio(len(match_terms(job.optional_skills, resume, use_embeddings)), len(job.optional_skills))
+    else:
+        optional_ratio = required_ratio
+    technical_skills = required_ratio * 16 + optional_ratio * 4
+
+    # 4. Education & certifications (10): degree 5, relevant courses 1 point each up to 5
+    degree_points = 0.0
+    if resume.degree_level and resume.degree_level >= (job.degree_level or 1):
+        degree_points = 5.0
+    course_points = min(5, sum(1 for course in resume.courses if _mentions_any(course, job.keywords)))
+    education_certifications = degree_points + course_points
+
+    # 5. Projects (10): highly relevant = at least two job keywords
+    relevant_projects = sum(1 for project in resume.projects if _mentions_any(project, job.keywords) >= 2)
+    projects_achievements = _ratio(relevant_projects, len(resume.projects)) * 10
+
+    # 6. Soft skills (5)
+    soft_skills_summary = _ratio(_mentions_any(resume.text, job.soft_skills), len(job.soft_skills)) * 5
+
+    scores = {
+        "keyword_match": round(keyword_match, 1),
+        "work_experience": round(work_experience, 1),
+        "technical_skills": round(technical_skills, 1),
+        "education_certifications": round(education_certifications, 1),
+        "projects_achievements": round(projects_achievements, 1),
+        "soft_skills_summary": round(soft_skills_summary, 1),
+    }
+    scores["total_score"] = round(sum(scores.values()), 1)
+    return scores
+
+
+def calculate_local_ats_score(latex_code, job_details, use_embeddings=ATS_USE_EMBEDDINGS):
+    """Deterministic ATS score of a LaTeX resume against job details."""
+    return score_resume(parse_resume(latex_code), parse_job(job_details), use_embeddings)
+
+
+def ats_cache_key(latex_code, job_details, engine):
+    """
+    Hash of the resume's plain text, the job details and the engine. Markup
+    and whitespace are stripped first, so edits that only change formatting
+    still hit the cache.
+    """
+    if isinstance(job_details, dict):
+        job = json.dumps(job_details, sort_keys=True, default=str)
+    else:
+        job = " ".join(str(job_details).split())
+    payload = json.dumps({
+        "version": ATS_CACHE_VERSION,
+        "engine": engine,
+        "resume": hashlib.sha256(latex_to_text(latex_code).encode('utf-8')).hexdigest(),
+        "job": hashlib.sha256(job.encode('utf-8')).hexdigest(),
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+ats_cache = TTLCache(ATS_CACHE_MAX_ENTRIES, ATS_CACHE_TTL)
+
+
+def get_cache_metrics():
+    return ats_cache.metrics()
+
+
+def score_resume_batch(latex_code, jobs, max_workers=None, use_embeddings=ATS_USE_EMBEDDINGS):
+    """
+    Rank one resume against many job descriptions.
+
+    The resume is parsed, and its vocabulary embedded, once; the jobs are
+    then scored on a bounded worker pool. Returns one result per job, each
+    {"index", "ats_score"} or {"index", "error"}, sorted by total score with
+    failures last.
+    """
+    resume = parse_resume(latex_code)
+    if use_embeddings and resume.terms:
+        embed_terms(get_embedding_model(), sorted(resume.terms))
+
+    def score(index, job):
+        try:
+            if not job or not isinstance(job, (dict, str)):
+                raise ValueError("Job description must be a non-empty object or string")
+            return {"index": index, "ats_score": score_resume(resume, parse_job(job), use_embeddings)}
+        except Exception as e:
+            return {"index": index, "error": str(e)}
+
+    if not jobs:
+        return []
+
+    workers = max(1, min(max_workers or ATS_BATCH_WORKERS, len(jobs)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(score, range(len(jobs)), jobs))
+    return sorted(results, key=lambda result: (
+        "error" in result, -result.get("ats_score", {}).get("total_score", 0), result["index"]
+    ))
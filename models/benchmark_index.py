@@ -0,0 +1,95 @@
+import argparse
+import json
+import time
+
+import faiss
+import numpy as np
+
+from skills_index import make_index, configure_search, LEGACY_EMBEDDINGS_PATH, SKILLS_PQ_M, SKILLS_HNSW_M
+
+# Recall vs. latency of approximate skills indexes against the exact flat index
+
+
+def recall_at_k(found, expected):
+    """Mean fraction of each query's exact top-k that the approximate search returned."""
+    k = expected.shape[1]
+    return float(np.mean([len(set(row) & set(truth)) / k for row, truth in zip(found, expected)]))
+
+
+def time_queries(index, queries, k):
+    """Search one query at a time, as /get_skills does; returns (ids, per-query milliseconds)."""
+    ids, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        _, row_ids = index.search(query.reshape(1, -1), k)
+        latencies.append((time.perf_counter() - start) * 1000.0)
+        ids.append(row_ids[0])
+    return np.array(ids), np.array(latencies)
+
+
+def measure(name, setting, index, queries, expected, k):
+    found, latencies = time_queries(index, queries, k)
+    return {
+        "index": name,
+        "setting": setting,
+        "recall": round(recall_at_k(found, expected), 4),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 4),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 4),
+    }
+
+
+def run_benchmark(embeddings, k=10, queries=200, nprobes=(1, 4, 8, 16, 32, 64), ef_searches=(16, 32, 64, 128, 256),
+                  pq_m=SKILLS_PQ_M, hnsw_m=SKILLS_HNSW_M, seed=0):
+    """
+    Build exact, IVF-PQ and HNSW indexes over `embeddings` and sweep their
+    search parameters. Queries are sampled rows with a little noise, so
+    they are near neighbours of the corpus rather than exact copies.
+    """
+    rng = np.random.default_rng(seed)
+    sample = embeddings[rng.choice(len(embeddings), size=min(queries, len(embeddings)), replace=False)]
+    query_vectors = (sample + rng.normal(0, 0.01, sample.shape)).astype('float32')
+
+    exact, _ = make_index(embeddings, "flat")
+    expected, _ = time_queries(exact, query_vectors, k)
+    results = [measure("flat", "exact", exact, query_vectors, expected, k)]
+
+    ivfpq, params = make_index(embeddings, "ivfpq", pq_m=pq_m)
+    for nprobe in nprobes:
+        if nprobe <= params["nlist"]:
+            configure_search(ivfpq, nprobe=nprobe)
+            results.append(measure("ivfpq", f"nprobe={nprobe} nlist={params['nlist']}", ivfpq, query_vectors, expected, k))
+
+    hnsw, _ = make_index(embeddings, "hnsw", hnsw_m=hnsw_m)
+    for ef_search in ef_searches:
+        configure_search(hnsw, ef_search=ef_search)
+        results.append(measure("hnsw", f"efSearch={ef_search}", hnsw, query_vectors, expected, k))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark approximate skills indexes against the exact index")
+    parser.add_argument("--embeddings", default=LEGACY_EMBEDDINGS_PATH)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--pq-m", type=int, default=SKILLS_PQ_M)
+    parser.add_argument("--hnsw-m", type=int, default=SKILLS_HNSW_M)
+    parser.add_argument("--threads", type=int, default=1, help="FAISS OpenMP threads (1 mirrors one request)")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args(argv)
+
+    faiss.omp_set_num_threads(args.threads)
+    embeddings = np.load(args.embeddings).astype('float32')
+    results = run_benchmark(embeddings, args.k, args.queries, pq_m=args.pq_m, hnsw_m=args.hnsw_m)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{len(embeddings)} vectors, dimension {embeddings.shape[1]}, recall@{args.k} over {args.queries} queries")
+    print(f"{'index':<8}{'setting':<28}{'recall':>8}{'p50 ms':>10}{'p95 ms':>10}")
+    for result in results:
+        print(f"{result['index']:<8}{result['setting']:<28}{result['recall']:>8.4f}"
+              f"{result['p50_ms']:>10.4f}{result['p95_ms']:>10.4f}")
+
+
+if __name__ == '__main__':
+    main()
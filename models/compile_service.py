@@ -0,0 +1,160 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from latex_build import build_sandbox, write_tex_file, compile_latex, CompileResult
+from pdf_cache import pdf_cache, source_key
+
+# Each worker drives at most one pdflatex process at a time
+LATEX_COMPILE_WORKERS = int(os.environ.get("LATEX_COMPILE_WORKERS", str(os.cpu_count() or 2)))
+LATEX_COMPILE_QUEUE_DEPTH = int(os.environ.get("LATEX_COMPILE_QUEUE_DEPTH", "16"))
+LATEX_JOB_TIMEOUT = float(os.environ.get("LATEX_JOB_TIMEOUT", "90"))
+LATEX_RETRY_AFTER = int(os.environ.get("LATEX_RETRY_AFTER", "5"))
+# How long a background job waits for a free compile slot before giving up
+LATEX_QUEUE_WAIT = float(os.environ.get("LATEX_QUEUE_WAIT", "300"))
+
+
+class CompileQueueFull(Exception):
+    """Raised when every worker is busy and the job queue is at its maximum depth."""
+
+
+class CompileTimeout(Exception):
+    """Raised when a job does not finish within its timeout, including queue time."""
+
+
+class CompileService:
+    """
+    Long-lived pool of LaTeX compile workers with a bounded job queue.
+
+    At most `workers` pdflatex processes run at once and at most `max_queue`
+    jobs wait behind them. Further submissions are rejected immediately with
+    CompileQueueFull so a burst of requests is turned away (HTTP 429) instead
+    of forking an unbounded number of compilers.
+    """
+
+    def __init__(self, workers=LATEX_COMPILE_WORKERS, max_queue=LATEX_COMPILE_QUEUE_DEPTH):
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="latex-compile")
+        self._slots = threading.BoundedSemaphore(self.workers + self.max_queue)
+        self._lock = threading.Lock()
+
+        self._pending = 0
+        self._running = 0
+        self.submitted = 0
+        self.rejected = 0
+        self.completed = 0
+        self.failed = 0
+        self.timed_out = 0
+
+    def _run(self, latex_code, jobname, deadline):
+        with self._lock:
+            self._running += 1
+        try:
+            with build_sandbox() as build_dir:
+                tex_file_path = write_tex_file(build_dir, latex_code, jobname=jobname)
+                result = compile_latex(tex_file_path, deadline=deadline)
+                # Read the PDF before the sandbox is removed
+                if result:
+                    with open(result.pdf_path, 'rb') as pdf_file:
+                        result.pdf_data = pdf_file.read()
+                    result.pdf_path = None
+            with self._lock:
+                if result:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+            return result
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            raise
+        finally:
+            with self._lock:
+                self._running -= 1
+
+    def _release(self, future):
+        with self._lock:
+            self._pending -= 1
+        self._slots.release()
+
+    def has_capacity(self):
+        """Cheap pre-check so callers can turn requests away before doing expensive work."""
+        with self._lock:
+            return self._pending < self.workers + self.max_queue
+
+    def submit(self, latex_code, jobname="my_resume", wait=None, timeout=LATEX_JOB_TIMEOUT):
+        """
+        Queue a compilation and return its Future, or raise CompileQueueFull.
+
+        By default a full queue is rejected at once; with `wait` seconds the
+        call blocks up to that long for a slot, for callers that already did
+        expensive work and would rather queue than fail. pdflatex is stopped
+        `timeout` seconds after the job is queued, so a job the caller gave up
+        on does not keep holding a worker.
+        """
+        acquired = self._slots.acquire(timeout=wait) if wait else self._slots.acquire(blocking=False)
+        if not acquired:
+            with self._lock:
+                self.rejected += 1
+            raise CompileQueueFull(
+                f"LaTeX compiler is busy ({self.workers} running, {self.max_queue} queued)"
+            )
+
+        with self._lock:
+            self._pending += 1
+            self.submitted += 1
+        deadline = time.monotonic() + timeout if timeout else None
+        future = self._executor.submit(self._run, latex_code, jobname, deadline)
+        future.add_done_callback(self._release)
+        return future
+
+    def compile(self, latex_code, jobname="my_resume", timeout=LATEX_JOB_TIMEOUT, wait=None):
+        """
+        Compile synchronously through the pool; returns a CompileResult with pdf_data.
+
+        Sources that were compiled before are served from the PDF cache without
+        taking a queue slot or invoking pdflatex. `wait` is passed to submit;
+        `timeout` counts from when the job is queued.
+        """
+        key = source_key(latex_code)
+        if pdf_cache:
+            pdf_data = pdf_cache.get(key)
+            if pdf_data is not None:
+                return CompileResult(True, pdf_data=pdf_data, cached=True, source_key=key)
+
+        future = self.submit(latex_code, jobname=jobname, wait=wait, timeout=timeout)
+        try:
+            result = future.result(timeout=timeout)
+            result.source_key = key
+            if result and pdf_cache:
+                pdf_cache.put(key, result.pdf_data, latex_code=latex_code)
+            return result
+        except FutureTimeoutError:
+            # Drop the job if it never left the queue; a running pdflatex is killed at the same deadline
+            future.cancel()
+            with self._lock:
+                self.timed_out += 1
+            raise CompileTimeout(f"LaTeX compilation did not finish within {timeout}s")
+
+    def metrics(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "running": self._running,
+                "queued": max(0, self._pending - self._running),
+                "submitted": self.submitted,
+                "rejected": self.rejected,
+                "completed": self.completed,
+                "failed": self.failed,
+                "timed_out": self.timed_out,
+            }
+
+
+compile_service = CompileService()
+
+
+def get_metrics():
+    return compile_service.metrics()
@@ -1,11 +1,17 @@
-import subprocess
 import os
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
-from llama_cpp import Llama
+import skills_cache
+from llama_pool import get_pool, count_tokens, pick_context_bucket, ACQUIRE_TIMEOUT, POOL_SIZE
 
 from prompt_templates import LATEX_RESUME_TEMPLATE
+from latex_stream import generate_latex_streaming, GEMINI_STREAMING
+from prompt_compaction import (
+    PROMPT_COMPACTION, to_prompt_json, compact_template, present_sections, prompt_stats
+)
 import google.generativeai as genai
 
 load_dotenv()
@@ -25,11 +31,41 @@ model_kwargs = {
 }
 
 model_path = "llama_model_skills.gguf"
+# Part of every skills cache key; hashed once at startup instead of on the request path
+model_hash = skills_cache.model_file_hash(model_path) if skills_cache.SKILLS_CACHE_MAX_ENTRIES > 0 else None
+
+# Context sizing for skills extraction: "bucket" tokenizes the prompt and uses the
+# smallest bucket that fits, "fixed" always uses model_kwargs["n_ctx"]
+SKILLS_CONTEXT_MODE = os.environ.get("SKILLS_CONTEXT_MODE", "bucket")
+SKILLS_CONTEXT_BUCKETS = [
+    int(size) for size in os.environ.get("SKILLS_CONTEXT_BUCKETS", "1024,2048,4096,8192").split(",") if size.strip()
+]
+SKILLS_MAX_TOKENS = 64
+
+# Batch extraction runs one worker per pooled model instance by default
+SKILLS_BATCH_WORKERS = int(os.environ.get("SKILLS_BATCH_WORKERS", str(POOL_SIZE)))
+SKILLS_BATCH_MAX_ITEMS = int(os.environ.get("SKILLS_BATCH_MAX_ITEMS", "500"))
+SKILLS_REQUIRED_FIELDS = ('job_title', 'job_role', 'job_description', 'responsibilities')
+
+# Skills extraction runs on this executor while the rest of the prompt is assembled
+PIPELINE_WORKERS = int(os.environ.get("PIPELINE_WORKERS", "8"))
+_pipeline_executor = ThreadPoolExecutor(max_workers=PIPELINE_WORKERS, thread_name_prefix="resume-pipeline")
+SKILLS_PLACEHOLDER = "\x00SKILLS\x00"
 # current_dir_path = os.getcwdb().decode('utf-8')  # Decode bytes to string
 # full_model_path = os.path.join(current_dir_path, model_path.lstrip('\\/')) # Use os.path.join and remove leading slashes from model_path
 
 
 
+def skills_model_kwargs(prompt):
+    """Pick the llama.cpp settings for a skills prompt, right-sizing n_ctx in bucket mode."""
+    if SKILLS_CONTEXT_MODE != "bucket" or not SKILLS_CONTEXT_BUCKETS:
+        return model_kwargs
+
+    needed = count_tokens(model_path, prompt) + SKILLS_MAX_TOKENS
+    n_ctx = pick_context_bucket(needed, SKILLS_CONTEXT_BUCKETS, default=model_kwargs["n_ctx"])
+    return {**model_kwargs, "n_ctx": n_ctx}
+
+
 def get_skills(job_description):
 
     input_prompt = """Below is an instruction that describes a task, paired with an input that provides further context. Write a response that appropriately completes the request.
@@ -53,20 +89,84 @@ def get_skills(job_description):
     query = query.format(job_description['job_title'], job_description['job_role'], job_description['job_description'], job_description['responsibilities'])
     prompt = input_prompt.format(query, "")
 
-    llm = Llama(model_path=model_path, verbose=False, **model_kwargs)
-    # llm = Llama(model_path=model_path, verbose=False, **model_kwargs)
-                
-    result = llm(
-            prompt,
-            max_tokens=64,
-        )
-        
-    return result["choices"][0]["text"]
+    # Repeat postings are answered from the persistent cache without local inference
+    cache = skills_cache.get_cache()
+    if cache:
+        cache_key = skills_cache.job_cache_key(job_description, model_hash)
+        cached_skills = cache.get(cache_key)
+        if cached_skills is not None:
+            return cached_skills
+
+    # Borrow a resident model from the shared pool instead of reloading the GGUF file
+    pool = get_pool(model_path, **skills_model_kwargs(prompt))
+    with pool.acquire(timeout=ACQUIRE_TIMEOUT) as llm:
+        result = llm(
+                prompt,
+                max_tokens=SKILLS_MAX_TOKENS,
+            )
 
+    skills = result["choices"][0]["text"]
+    if cache:
+        cache.put(cache_key, skills)
+    return skills
 
-def generate_latex_file(job_description, profile=None, resume=None):
-    
-    skills = get_skills(job_description)
+
+def get_skills_batch(job_descriptions, max_workers=None):
+    """
+    Run skills extraction over a list of job descriptions in one pass.
+
+    Items are spread over a worker pool that shares the resident models, and
+    results come back in input order. Each result is either {"skills": ...}
+    or {"error": ...}, so one bad posting does not fail the whole batch.
+    """
+    def extract(job_description):
+        try:
+            if not isinstance(job_description, dict):
+                raise ValueError("Job description must be an object")
+            missing = [field for field in SKILLS_REQUIRED_FIELDS if field not in job_description]
+            if missing:
+                raise ValueError(f"Missing fields: {', '.join(missing)}")
+            return {"skills": get_skills(job_description)}
+        except Exception as e:
+            return {"error": str(e)}
+
+    if not job_descriptions:
+        return []
+
+    workers = max(1, min(max_workers or SKILLS_BATCH_WORKERS, len(job_descriptions)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(extract, job_descriptions))
+
+
+def _elapsed(start):
+    return round(time.perf_counter() - start, 4)
+
+
+def _timed_skills(job_description, timings):
+    start = time.perf_counter()
+    try:
+        return get_skills(job_description)
+    finally:
+        timings["skills"] = _elapsed(start)
+
+
+def generate_latex_file(job_description, profile=None, resume=None, progress=None, timings=None, prompt_report=None):
+    """
+    Generate a tailored LaTeX resume. `progress`, if given, is called with the
+    name of each pipeline stage as it starts.
+
+    Skills extraction runs in the background while the profile and resume are
+    serialized and the prompt is assembled around a placeholder. Stage
+    durations in seconds are written into `timings`, if given, along with
+    which branch was on the critical path. The prompt size is written into
+    `prompt_report`, if given.
+    """
+    timings = {} if timings is None else timings
+    pipeline_start = time.perf_counter()
+
+    if progress:
+        progress("skills")
+    skills_future = _pipeline_executor.submit(_timed_skills, job_description, timings)
     # skills = "Data architecture design Database management systems Data modeling"
 
     prompt = """
@@ -109,74 +209,60 @@ def generate_latex_file(job_description, profile=None, resume=None):
     Return ONLY the complete LaTeX code without explanations or markdown formatting.
     """
 
-    # Replace placeholders with actual data
-    prompt = prompt.format(
-        job_description=json.dumps(job_description, indent=2),
-        profile=json.dumps(profile, indent=2) if profile else "No profile information available",
-        resume=json.dumps(resume, indent=2) if resume else "No resume information available",
-        skills=skills,
-        latex_template=LATEX_RESUME_TEMPLATE
-    )
-
-    response = model_gemini.generate_content(prompt)
+    # Replace placeholders with actual data while the skills model is still running
+    assembly_start = time.perf_counter()
+    if PROMPT_COMPACTION:
+        # Minified JSON without empty/NA fields, and a comment-free template without unused sections
+        prompt = prompt.format(
+            job_description=to_prompt_json(job_description, "No job description available"),
+            profile=to_prompt_json(profile, "No profile information available"),
+            resume=to_prompt_json(resume, "No resume information available"),
+            skills=SKILLS_PLACEHOLDER,
+            latex_template=compact_template(LATEX_RESUME_TEMPLATE, present_sections(profile, resume))
+        )
+    else:
+        prompt = prompt.format(
+            job_description=json.dumps(job_description, indent=2),
+            profile=json.dumps(profile, indent=2) if profile else "No profile information available",
+            resume=json.dumps(resume, indent=2) if resume else "No resume information available",
+            skills=SKILLS_PLACEHOLDER,
+            latex_template=LATEX_RESUME_TEMPLATE
+        )
+    timings["prompt_assembly"] = _elapsed(assembly_start)
+
+    wait_start = time.perf_counter()
+    skills = skills_future.result()
+    timings["skills_wait"] = _elapsed(wait_start)
+    prompt = prompt.replace(SKILLS_PLACEHOLDER, skills)
+    timings["critical_path"] = "skills" if timings["skills"] >= timings["prompt_assembly"] else "prompt_assembly"
+
+    if prompt_report is not None:
+        prompt_report.update(prompt_stats(prompt, model=model_gemini))
+
+    if progress:
+        progress("latex_generation")
+    generation_start = time.perf_counter()
+    if GEMINI_STREAMING:
+        # Validate while streaming so bad generations are abandoned and retried early
+        latex_code, attempts = generate_latex_streaming(model_gemini, prompt)
+        timings["generation_attempts"] = attempts
+    else:
+        response = model_gemini.generate_content(prompt)
+        latex_code = response.text
+    timings["latex_generation"] = _elapsed(generation_start)
     # print(response)
 
     # Extract just the LaTeX code from the response
-    latex_code = response.text.strip()
+    latex_code = latex_code.strip()
     if latex_code.startswith("```latex"):
         latex_code = latex_code[8:]  # Remove the ```latex part
     if latex_code.endswith("```"):
         latex_code = latex_code[:-3]  # Remove the ending ``` part
     
-    # Save the LaTeX code to a file
-    with open("my_resume.tex", "w") as f:
-        f.write(latex_code)
-    
+    timings["total"] = _elapsed(pipeline_start)
     return latex_code
 
 
-def convert_tex_to_pdf(tex_file_path):
-    """
-    Compile LaTeX file to PDF using pdflatex
-    """
-    try:
-        # Change working directory to the .tex file's directory
-        original_dir = os.getcwd()
-        target_dir = os.path.dirname(tex_file_path)
-        if target_dir:
-            os.chdir(target_dir)
-        
-        tex_file = os.path.basename(tex_file_path)
-        
-        # Run pdflatex twice to resolve references
-        for _ in range(2):
-            result = subprocess.run(
-                ['pdflatex', '-interaction=nonstopmode', tex_file],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE
-            )
-            if result.returncode != 0:
-                print("Error during compilation:")
-                print(result.stderr.decode())
-                return False
-        
-        print(f"Successfully generated {tex_file.replace('.tex', '.pdf')}")
-
-        # Clean auxiliary files (optional)
-        base_name = os.path.splitext(tex_file)[0]
-        for ext in ['.aux', '.log', '.out']:
-            file_to_remove = f"{base_name}{ext}"
-            if os.path.exists(file_to_remove):
-                os.remove(file_to_remove)
-
-        return True
-        
-    except Exception as e:
-        print(f"An error occurred: {str(e)}")
-        return False
-    finally:
-        os.chdir(original_dir)
-
 if __name__ == "__main__":
     # Load job description from jd_format.json
     with open('test/jd_format.json', 'r') as jd_file:
@@ -192,8 +278,5 @@ if __name__ == "__main__":
 
     # latex_code = generate_latex_file(job_description=jd_format, profile=profile, resume=resume)
 
-    # tex_file = "my_resume.tex"  # Change this path if needed
-    # convert_tex_to_pdf(tex_file)
-
     skills = get_skills(job_description=jd_format)
     print(skills)
\ No newline at end of file
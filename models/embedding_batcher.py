@@ -0,0 +1,107 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from memo_cache import TTLCache
+
+# Micro-batching of query embeddings
+EMBEDDING_BATCH_MAX_SIZE = int(os.environ.get("EMBEDDING_BATCH_MAX_SIZE", "32"))
+EMBEDDING_BATCH_WAIT_MS = float(os.environ.get("EMBEDDING_BATCH_WAIT_MS", "5"))
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.environ.get("EMBEDDING_CACHE_MAX_ENTRIES", "4096"))
+EMBEDDING_TIMEOUT = float(os.environ.get("EMBEDDING_TIMEOUT", "30"))
+
+
+def normalize_text(text):
+    """Cache key for a query. The MiniLM tokenizer is uncased, so case and spacing do not change the vector."""
+    return " ".join(str(text).lower().split())
+
+
+class EmbeddingBatcher:
+    """
+    Gathers concurrent encode requests over a short window into one
+    `model.encode` call, and keeps an LRU of normalized text -> vector so
+    repeated queries skip the transformer entirely.
+
+    `get_model` is called on the worker thread when the first batch runs,
+    so the model still loads lazily.
+    """
+
+    def __init__(self, get_model, max_batch=EMBEDDING_BATCH_MAX_SIZE, max_wait_ms=EMBEDDING_BATCH_WAIT_MS,
+                 cache_size=EMBEDDING_CACHE_MAX_ENTRIES):
+        self.get_model = get_model
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_ms / 1000.0
+        self.cache = TTLCache(cache_size)
+        self._queue = queue.Queue()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._worker_pid = None
+        self.batches = 0
+        self.batched_texts = 0
+
+    def _ensure_worker(self):
+        # Threads do not survive fork, so each worker process starts its own
+        if self._worker_pid != os.getpid():
+            self._worker_pid = os.getpid()
+            self._queue = queue.Queue()
+            self._pending = {}
+            threading.Thread(target=self._run, daemon=True, name="embedding-batcher").start()
+
+    def encode(self, text, timeout=EMBEDDING_TIMEOUT):
+        """Embedding vector (float32) of one text."""
+        key = normalize_text(text)
+        vector = self.cache.get(key)
+        if vector is not None:
+            return vector
+
+        with self._lock:
+            self._ensure_worker()
+            future = self._pending.get(key)
+            if future is None:
+                future = Future()
+                self._pending[key] = future
+                self._queue.put(key)
+        return future.result(timeout=timeout)
+
+    def _collect(self):
+        keys = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(keys) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                keys.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return keys
+
+    def _run(self):
+        while True:
+            keys = self._collect()
+            with self._lock:
+                futures = [self._pending.pop(key) for key in keys]
+            try:
+                vectors = self.get_model().encode(keys, batch_size=len(keys)).astype('float32')
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.batched_texts += len(keys)
+            for key, future, vector in zip(keys, futures, vectors):
+                self.cache.put(key, vector)
+                future.set_result(vector)
+
+    def metrics(self):
+        return {
+            "batches": self.batches,
+            "batched_texts": self.batched_texts,
+            "mean_batch_size": round(self.batched_texts / self.batches, 2) if self.batches else 0.0,
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "cache": self.cache.metrics(),
+        }
@@ -0,0 +1,293 @@
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# Background executor for long-running pipelines
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "4"))
+JOB_MAX_PENDING = int(os.environ.get("JOB_MAX_PENDING", "64"))
+JOB_TTL_SECONDS = float(os.environ.get("JOB_TTL_SECONDS", "3600"))
+SSE_KEEPALIVE_SECONDS = 15
+# Job state and artifacts are mirrored here so any worker process can serve
+# /jobs/<id>, not only the one running the job; empty keeps state in memory,
+# which only works with a single process
+JOB_STATE_DIR = os.environ.get("JOB_STATE_DIR", "job_state")
+JOB_POLL_SECONDS = float(os.environ.get("JOB_POLL_SECONDS", "0.5"))
+
+JOB_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+
+class JobQueueFull(Exception):
+    """Raised when too many jobs are already queued or running."""
+
+
+class Job:
+    """
+    State of one background pipeline run.
+
+    Stages report progress through `report`, which appends an event and wakes
+    anyone streaming the job's events.
+    """
+
+    def __init__(self, kind, state_dir=None):
+        self.id = uuid.uuid4().hex
+        self.state_dir = state_dir
+        self.kind = kind
+        self.status = "queued"
+        self.stage = None
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.events = []
+        self.artifacts = {}
+        self._condition = threading.Condition()
+        self._add_event("queued")
+
+    @property
+    def done(self):
+        return self.status in ("succeeded", "failed")
+
+    def _add_event(self, event_type, **data):
+        # Callers hold self._condition or are still constructing the job
+        self.updated_at = time.time()
+        self.events.append({"type": event_type, "time": self.updated_at, "stage": self.stage, **data})
+        self._save()
+
+    def _save(self):
+        """Write the job's state file atomically, for workers that do not hold the job."""
+        if not self.state_dir:
+            return
+        state = {**self.to_dict(), "mimetypes": {name: mimetype for name, (_, mimetype) in self.artifacts.items()}}
+        path = state_path(self.state_dir, self.id)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(state, f)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"Could not save job {self.id} state: {str(e)}")
+
+    def report(self, stage, **details):
+        """Record that the pipeline entered `stage`."""
+        with self._condition:
+            self.stage = stage
+            self._add_event("progress", **details)
+            self._condition.notify_all()
+
+    def attach(self, name, data, mimetype):
+        """
+        Keep a binary output (e.g. the compiled PDF) with the job until it
+        expires, and return the path it is served from.
+        """
+        with self._condition:
+            self.artifacts[name] = (data, mimetype)
+            if self.state_dir:
+                try:
+                    with open(artifact_path(self.state_dir, self.id, name), 'wb') as f:
+                        f.write(data)
+                except OSError as e:
+                    print(f"Could not save job {self.id} artifact {name}: {str(e)}")
+            self._save()
+        return f"/jobs/{self.id}/artifacts/{name}"
+
+    def artifact(self, name):
+        """(data, mimetype) of an attached artifact, or None."""
+        with self._condition:
+            return self.artifacts.get(name)
+
+    def _start(self):
+        with self._condition:
+            self.status = "running"
+            self._add_event("running")
+            self._condition.notify_all()
+
+    def _finish(self, result=None, error=None):
+        with self._condition:
+            if error is None:
+                self.status = "succeeded"
+                self.result = result
+                self._add_event("succeeded", result=result)
+            else:
+                self.status = "failed"
+                self.error = error
+                self._add_event("failed", error=error)
+            self._condition.notify_all()
+
+    def iter_events(self, keepalive=SSE_KEEPALIVE_SECONDS):
+        """Yield events as they happen; yields None as a keep-alive while idle."""
+        index = 0
+        while True:
+            with self._condition:
+                if index >= len(self.events) and not self.done:
+                    self._condition.wait(timeout=keepalive)
+                pending = self.events[index:]
+                index = len(self.events)
+                finished = self.done
+            if not pending and not finished:
+                yield None
+            for event in pending:
+                yield event
+            if finished and index >= len(self.events):
+                return
+
+    def to_dict(self):
+        with self._condition:
+            return {
+                "job_id": self.id,
+                "kind": self.kind,
+                "status": self.status,
+                "stage": self.stage,
+                "result": self.result,
+                "error": self.error,
+                "created_at": self.created_at,
+                "updated_at": self.updated_at,
+                "events": list(self.events),
+                "artifacts": sorted(self.artifacts),
+            }
+
+
+def state_path(state_dir, job_id):
+    return os.path.join(state_dir, f"{job_id}.json")
+
+
+def artifact_path(state_dir, job_id, name):
+    return os.path.join(state_dir, f"{job_id}.{name}")
+
+
+class StoredJob:
+    """
+    Read-only view of a job held by another worker process, backed by its
+    state file. Events are followed by re-reading the file.
+    """
+
+    def __init__(self, state_dir, job_id, state):
+        self.state_dir = state_dir
+        self.id = job_id
+        self.state = state
+
+    @classmethod
+    def load(cls, state_dir, job_id):
+        try:
+            with open(state_path(state_dir, job_id)) as f:
+                return cls(state_dir, job_id, json.load(f))
+        except (OSError, ValueError):
+            return None
+
+    @property
+    def done(self):
+        return self.state["status"] in ("succeeded", "failed")
+
+    def _reload(self):
+        latest = StoredJob.load(self.state_dir, self.id)
+        if latest is not None:
+            self.state = latest.state
+
+    def artifact(self, name):
+        mimetype = self.state.get("mimetypes", {}).get(name)
+        if mimetype is None:
+            return None
+        try:
+            with open(artifact_path(self.state_dir, self.id, name), 'rb') as f:
+                return f.read(), mimetype
+        except OSError:
+            return None
+
+    def iter_events(self, keepalive=SSE_KEEPALIVE_SECONDS, poll=JOB_POLL_SECONDS):
+        """Same contract as Job.iter_events, polling the state file."""
+        index = 0
+        idle_since = time.monotonic()
+        while True:
+            events = self.state["events"]
+            pending = events[index:]
+            index = len(events)
+            for event in pending:
+                yield event
+            if self.done:
+                return
+            if pending:
+                idle_since = time.monotonic()
+            elif time.monotonic() - idle_since >= keepalive:
+                idle_since = time.monotonic()
+                yield None
+            time.sleep(poll)
+            self._reload()
+
+    def to_dict(self):
+        return {key: value for key, value in self.state.items() if key != "mimetypes"}
+
+
+class JobManager:
+    """
+    Runs pipelines on a background executor and keeps their state for polling.
+
+    Jobs run in the process that accepted them; with a `state_dir`, the
+    other worker processes serve their status, events and artifacts from it.
+    """
+
+    def __init__(self, workers=JOB_WORKERS, max_pending=JOB_MAX_PENDING, ttl=JOB_TTL_SECONDS,
+                 state_dir=JOB_STATE_DIR):
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self.state_dir = state_dir
+        if state_dir:
+            os.makedirs(state_dir, exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def _purge_expired(self):
+        cutoff = time.time() - self.ttl
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.done and job.updated_at < cutoff]:
+            del self._jobs[job_id]
+        if not self.state_dir:
+            return
+        # State files of any worker's jobs, including ones whose process died
+        for name in os.listdir(self.state_dir):
+            job_id = name.split(".", 1)[0]
+            path = os.path.join(self.state_dir, name)
+            try:
+                if job_id not in self._jobs and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def submit(self, kind, fn, *args, **kwargs):
+        """
+        Run `fn(*args, progress=job.report, attach=job.attach, **kwargs)` in
+        the background.
+
+        The return value becomes the job result; an exception fails the job
+        with its message. Attached artifacts live as long as the job.
+        """
+        with self._lock:
+            self._purge_expired()
+            active = sum(1 for job in self._jobs.values() if not job.done)
+            if active >= self.max_pending:
+                raise JobQueueFull(f"Too many jobs in progress ({active})")
+            job = Job(kind, self.state_dir)
+            self._jobs[job.id] = job
+
+        def run():
+            job._start()
+            try:
+                job._finish(result=fn(*args, progress=job.report, attach=job.attach, **kwargs))
+            except Exception as e:
+                job._finish(error=str(e))
+
+        self._executor.submit(run)
+        return job
+
+    def get(self, job_id):
+        """The job if this process runs it, else its stored state from another worker, else None."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None and self.state_dir and JOB_ID_PATTERN.match(job_id):
+            job = StoredJob.load(self.state_dir, job_id)
+        return job
+
+
+job_manager = JobManager()
@@ -0,0 +1,301 @@
+import fcntl
+import hashlib
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+# Parent directory for per-request build directories (system temp dir by default)
+LATEX_BUILD_ROOT = os.environ.get("LATEX_BUILD_ROOT") or None
+
+# pdflatex passes: only rerun when the log asks for it, up to this many passes
+LATEX_MAX_PASSES = int(os.environ.get("LATEX_MAX_PASSES", "3"))
+LATEX_PASS_TIMEOUT = float(os.environ.get("LATEX_PASS_TIMEOUT", "30"))
+
+# Warnings LaTeX and its packages emit when another pass would change the output
+RERUN_PATTERN = re.compile(
+    r"Rerun to get|may have changed\.\s*Rerun|Please rerun LaTeX|Rerun LaTeX",
+    re.IGNORECASE
+)
+
+# Precompiled preamble: the static part of the template preamble is dumped into a
+# custom format once, and matching documents are compiled against it
+LATEX_PRECOMPILED_PREAMBLE = os.environ.get("LATEX_PRECOMPILED_PREAMBLE", "1") == "1"
+LATEX_FORMAT_DIR = os.environ.get("LATEX_FORMAT_DIR", os.path.join(tempfile.gettempdir(), "resume_latex_format"))
+LATEX_FORMAT_NAME = "resume_preamble"
+
+# The format stops before the per-user definitions, which differ in every resume
+USER_INFO_MARKER = re.compile(r"DEFINE USER INFO|\\newcommand\{\\name\}")
+
+
+@contextmanager
+def build_sandbox(prefix="resume_"):
+    """
+    Private build directory for one LaTeX compilation.
+
+    Every request writes its .tex/.aux/.log/.pdf files into its own directory,
+    so concurrent compilations never see each other's files. The directory is
+    removed when the `with` block exits.
+    """
+    build_dir = tempfile.mkdtemp(prefix=prefix, dir=LATEX_BUILD_ROOT)
+    try:
+        yield build_dir
+    finally:
+        shutil.rmtree(build_dir, ignore_errors=True)
+
+
+def write_tex_file(build_dir, latex_code, jobname="my_resume"):
+    """Write LaTeX source into the build directory and return the .tex path."""
+    tex_file_path = os.path.join(build_dir, f"{jobname}.tex")
+    with open(tex_file_path, "w", encoding='utf-8') as f:
+        f.write(latex_code)
+    return tex_file_path
+
+
+@dataclass
+class CompileResult:
+    """Outcome of compiling one .tex file; truthy when a PDF was produced."""
+    success: bool
+    pdf_path: str = None
+    passes: int = 0
+    output: str = ""
+    used_format: bool = False
+    pdf_data: bytes = None
+    cached: bool = False
+    source_key: str = None
+
+    def __bool__(self):
+        return self.success
+
+
+def needs_rerun(log_text):
+    """True if the pdflatex log asks for another pass to settle references."""
+    return bool(RERUN_PATTERN.search(log_text or ""))
+
+
+def read_log(tex_file_path):
+    log_path = os.path.splitext(tex_file_path)[0] + '.log'
+    if not os.path.exists(log_path):
+        return ""
+    with open(log_path, 'r', encoding='utf-8', errors='replace') as f:
+        return f.read()
+
+
+def _normalize_line(line):
+    """Drop comments and whitespace so cosmetic preamble edits still match the format."""
+    line = re.sub(r"(?<!\\)%.*", "", line)
+    return " ".join(line.split())
+
+
+def static_preamble(latex_code):
+    """Template preamble up to the per-user definitions, or None if there is no preamble."""
+    end = latex_code.find('\\begin{document}')
+    if end == -1:
+        return None
+    preamble = latex_code[:end]
+    marker = USER_INFO_MARKER.search(preamble)
+    if marker:
+        preamble = preamble[:preamble.rfind('\n', 0, marker.start()) + 1]
+    return preamble
+
+
+class PreambleFormat:
+    """
+    Custom pdflatex format holding the template's package preamble.
+
+    Built once with mylatexformat. Documents whose preamble starts with the
+    same (normalized) lines get an \\endofdump marker after that prefix and are
+    compiled with -fmt, skipping package loading; anything else falls back to
+    a normal compile.
+    """
+
+    def __init__(self, format_dir=LATEX_FORMAT_DIR, name=LATEX_FORMAT_NAME):
+        self.format_dir = format_dir
+        self.name = name
+        self.lines = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self):
+        return self.lines is not None
+
+    def build(self, template):
+        """
+        Dump the template's static preamble into <format_dir>/<name>.fmt.
+
+        Worker processes share the format directory: the build runs under an
+        fcntl lock in a private temp directory and the finished .fmt is
+        renamed into place, so a concurrent compile never reads a partial
+        file. A format already built from the same preamble is reused.
+        """
+        preamble = static_preamble(template.strip())
+        if not preamble:
+            raise ValueError("Template has no preamble")
+        digest = hashlib.sha256(preamble.encode('utf-8')).hexdigest()
+
+        with self._lock:
+            os.makedirs(self.format_dir, exist_ok=True)
+            fmt_path = os.path.join(self.format_dir, f"{self.name}.fmt")
+            digest_path = os.path.join(self.format_dir, f"{self.name}.sha256")
+            with open(os.path.join(self.format_dir, ".lock"), "w") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    if not self._is_current(fmt_path, digest_path, digest):
+                        self._build_into(fmt_path, preamble)
+                        with open(digest_path, "w") as f:
+                            f.write(digest)
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+            self.lines = [line for line in map(_normalize_line, preamble.splitlines()) if line]
+
+    @staticmethod
+    def _is_current(fmt_path, digest_path, digest):
+        try:
+            with open(digest_path) as f:
+                return os.path.exists(fmt_path) and f.read().strip() == digest
+        except OSError:
+            return False
+
+    def _build_into(self, fmt_path, preamble):
+        build_dir = tempfile.mkdtemp(prefix="build_", dir=self.format_dir)
+        try:
+            with open(os.path.join(build_dir, f"{self.name}.tex"), "w", encoding='utf-8') as f:
+                f.write(preamble + "\\begin{document}\n\\end{document}\n")
+
+            process = subprocess.run(
+                ['pdflatex', '-ini', '-interaction=nonstopmode', f'-jobname={self.name}',
+                 '&pdflatex', 'mylatexformat.ltx', f"{self.name}.tex"],
+                cwd=build_dir,
+                capture_output=True,
+                text=True,
+                errors='replace',
+                timeout=120
+            )
+            built_path = os.path.join(build_dir, f"{self.name}.fmt")
+            if process.returncode != 0 or not os.path.exists(built_path):
+                raise RuntimeError(f"Format build failed: {process.stdout[-2000:]}")
+            os.replace(built_path, fmt_path)
+        finally:
+            shutil.rmtree(build_dir, ignore_errors=True)
+
+    def apply(self, latex_code):
+        """
+        Return the document with \\endofdump inserted after the precompiled
+        prefix, or None if its preamble does not start with that prefix.
+        """
+        if not self.ready:
+            return None
+
+        raw_lines = latex_code.splitlines(keepends=True)
+        matched = 0
+        for position, raw_line in enumerate(raw_lines):
+            line = _normalize_line(raw_line)
+            if not line:
+                continue
+            if line != self.lines[matched]:
+                return None
+            matched += 1
+            if matched == len(self.lines):
+                return "".join(raw_lines[:position + 1]) + "\\endofdump\n" + "".join(raw_lines[position + 1:])
+        return None
+
+    def env(self):
+        # Let kpathsea find the format next to the default search path
+        return {**os.environ, "TEXFORMATS": f"{self.format_dir}{os.pathsep}"}
+
+
+preamble_format = PreambleFormat()
+
+
+def init_preamble_format(template):
+    """Build the shared preamble format at startup; compiles fall back if this fails."""
+    if not LATEX_PRECOMPILED_PREAMBLE:
+        return False
+    try:
+        preamble_format.build(template)
+        print(f"Built LaTeX preamble format in {preamble_format.format_dir}")
+        return True
+    except Exception as e:
+        print(f"Precompiled preamble disabled: {str(e)}")
+        return False
+
+
+def _run_passes(tex_file_path, max_passes, timeout, fmt=None, env=None, deadline=None):
+    build_dir = os.path.dirname(os.path.abspath(tex_file_path))
+    tex_file = os.path.basename(tex_file_path)
+    pdf_path = os.path.join(build_dir, os.path.splitext(tex_file)[0] + '.pdf')
+    command = ['pdflatex', '-interaction=nonstopmode']
+    if fmt:
+        command.append(f'-fmt={fmt}')
+
+    passes = 0
+    output = ""
+    while passes < max(1, max_passes):
+        # Each pass gets its own timeout, cut short by the job's overall deadline
+        pass_timeout = timeout
+        if deadline is not None:
+            pass_timeout = min(timeout, deadline - time.monotonic())
+            if pass_timeout <= 0:
+                return CompileResult(False, passes=passes, output="Compile deadline reached before pdflatex finished")
+        passes += 1
+        try:
+            process = subprocess.run(
+                command + [tex_file],
+                cwd=build_dir,
+                env=env,
+                capture_output=True,
+                text=True,
+                errors='replace',
+                timeout=pass_timeout
+            )
+        except subprocess.TimeoutExpired:
+            return CompileResult(False, passes=passes, output=f"pdflatex timed out after {pass_timeout:.1f}s")
+
+        output = process.stdout + "\n" + process.stderr
+        if process.returncode != 0:
+            return CompileResult(False, passes=passes, output=output)
+
+        if not needs_rerun(read_log(tex_file_path)):
+            break
+
+    if not os.path.exists(pdf_path):
+        return CompileResult(False, passes=passes, output=output + "\nPDF file was not generated")
+
+    return CompileResult(True, pdf_path=pdf_path, passes=passes, output=output, used_format=bool(fmt))
+
+
+def compile_latex(tex_file_path, max_passes=LATEX_MAX_PASSES, timeout=LATEX_PASS_TIMEOUT, deadline=None):
+    """
+    Compile a .tex file with pdflatex inside its own directory.
+
+    A first pass always runs; further passes run only while the log reports
+    "Rerun to get ..." style warnings, capped at `max_passes`. Documents that
+    share the template preamble are compiled against the precompiled format,
+    with a normal compile as fallback. `deadline` (a time.monotonic() value)
+    bounds all passes together, fallback included, and a pass still running
+    at the deadline is killed.
+    """
+    with open(tex_file_path, 'r', encoding='utf-8') as f:
+        latex_code = f.read()
+
+    formatted = preamble_format.apply(latex_code)
+    if formatted is not None:
+        with open(tex_file_path, 'w', encoding='utf-8') as f:
+            f.write(formatted)
+        result = _run_passes(tex_file_path, max_passes, timeout,
+                             fmt=preamble_format.name, env=preamble_format.env(), deadline=deadline)
+        if result or (deadline is not None and time.monotonic() >= deadline):
+            return result
+
+        # Restore the original source and compile without the format
+        print("Compile against preamble format failed, falling back to full preamble")
+        with open(tex_file_path, 'w', encoding='utf-8') as f:
+            f.write(latex_code)
+
+    return _run_passes(tex_file_path, max_passes, timeout, deadline=deadline)
@@ -0,0 +1,133 @@
+import re
+
+from latex_stream import ENVIRONMENT_PATTERN, strip_comment
+
+SECTION_PATTERN = re.compile(r'^[ \t]*\\section\*?\{([^}]*)\}', re.M)
+
+# Words in a modification request that point at a section, keyed by a word in its title.
+# Aliases match whole words; a trailing "*" allows any ending (technolog* -> technology, technologies)
+SECTION_ALIASES = {
+    "about": ("about me", "about section", "summary", "objective", "intro", "introduction", "bio"),
+    "education": ("education", "degree*", "university", "college", "school", "gpa", "cgpa"),
+    "experience": ("experience*", "work", "job*", "internship*", "employment"),
+    "project": ("project*",),
+    "skill": ("skill*", "technolog*", "language*", "framework*", "tool*", "database*", "stack"),
+    "course": ("course*", "certific*"),
+}
+
+
+def _word_pattern(word):
+    if word.endswith('*'):
+        return re.compile(r'\b' + re.escape(word[:-1]) + r'\w*', re.IGNORECASE)
+    return re.compile(r'\b' + re.escape(word) + r's?\b', re.IGNORECASE)
+
+
+# Titles that are also everyday words ("a bullet about APIs") only match through their aliases
+AMBIGUOUS_TITLES = {"about"}
+
+ALIAS_PATTERNS = {key: [_word_pattern(alias) for alias in aliases] for key, aliases in SECTION_ALIASES.items()}
+
+# Requests that touch layout or the whole document cannot be handled per section
+GLOBAL_HINTS = re.compile(
+    r'\b(whole|entire|overall|everything|every section|all sections|layout|format|font|colou?r|'
+    r'margin|spacing|page|header|heading|contact|phone|email|linkedin|github|reorder|rearrange|'
+    r'order of|style|template|add a section|new section|remove section)\b',
+    re.IGNORECASE
+)
+
+
+def split_sections(latex_code):
+    """
+    Split a resume into (head, sections, tail).
+
+    `sections` is a list of (title, text) pairs, each text running from its
+    \\section line up to the next section or \\end{document}. Joining head,
+    the section texts and tail gives back the original document.
+    """
+    body_end = latex_code.rfind('\\end{document}')
+    if body_end == -1:
+        body_end = len(latex_code)
+
+    matches = list(SECTION_PATTERN.finditer(latex_code, 0, body_end))
+    if not matches:
+        return latex_code[:body_end], [], latex_code[body_end:]
+
+    sections = []
+    for index, match in enumerate(matches):
+        end = matches[index + 1].start() if index + 1 < len(matches) else body_end
+        sections.append((match.group(1).strip(), latex_code[match.start():end]))
+    return latex_code[:matches[0].start()], sections, latex_code[body_end:]
+
+
+def find_target_sections(query, titles):
+    """
+    Titles of the sections a modification request is about, in document
+    order. Returns an empty list when the request is global or names no
+    section, meaning the whole document has to be edited.
+    """
+    if GLOBAL_HINTS.search(query):
+        return []
+
+    targets = []
+    for title in titles:
+        title_lower = title.lower()
+        if title_lower not in AMBIGUOUS_TITLES and re.search(
+                r'\b' + re.escape(title_lower) + r'\b', query, re.IGNORECASE):
+            targets.append(title)
+            continue
+        for key, patterns in ALIAS_PATTERNS.items():
+            if key in title_lower and any(pattern.search(query) for pattern in patterns):
+                targets.append(title)
+                break
+    return targets
+
+
+def environments_balanced(latex_code):
+    """
+    True if every \\begin{...} in the fragment has a matching, properly nested
+    \\end{...}. Commented-out environments are ignored, as in LatexStreamValidator.
+    """
+    stack = []
+    for line in latex_code.splitlines():
+        for match in ENVIRONMENT_PATTERN.finditer(strip_comment(line)):
+            kind, name = match.group(1), match.group(2).strip()
+            if kind == 'begin':
+                stack.append(name)
+            elif not stack or stack.pop() != name:
+                return False
+    return not stack
+
+
+def split_trailer(section_text):
+    """
+    Split a section into (content, trailer), where the trailer is the blank
+    and comment lines at its end, such as the next section's separator.
+    """
+    lines = section_text.splitlines(keepends=True)
+    cut = len(lines)
+    while cut > 0 and (not lines[cut - 1].strip() or lines[cut - 1].lstrip().startswith('%')):
+        cut -= 1
+    return "".join(lines[:cut]), "".join(lines[cut:])
+
+
+def parse_section_fragments(text):
+    """Map section title -> fragment text for model output made of \\section blocks."""
+    text = text.replace('```latex', '').replace('```', '').strip()
+    _, sections, _ = split_sections(text)
+    return {title: split_trailer(fragment)[0] for title, fragment in sections}
+
+
+def splice_sections(latex_code, replacements):
+    """
+    Replace the content of the named sections, keeping each section's trailing
+    separator lines; everything else stays byte-identical.
+    """
+    head, sections, tail = split_sections(latex_code)
+    parts = [head]
+    for title, text in sections:
+        if title in replacements:
+            content, trailer = split_trailer(text)
+            text = replacements[title].rstrip() + "\n" + (trailer or "\n")
+        parts.append(text)
+    parts.append(tail)
+    return "".join(parts)
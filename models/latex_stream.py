@@ -0,0 +1,120 @@
+import os
+import re
+
+# Stream Gemini output and validate it as it arrives instead of after the full response
+GEMINI_STREAMING = os.environ.get("GEMINI_STREAMING", "1") == "1"
+GEMINI_MAX_ATTEMPTS = int(os.environ.get("GEMINI_MAX_ATTEMPTS", "2"))
+
+DOCUMENT_START = '\\documentclass'
+ENVIRONMENT_PATTERN = re.compile(r'\\(begin|end)\s*\{([^}]*)\}')
+# A % not escaped by an odd number of backslashes starts a comment
+COMMENT_PATTERN = re.compile(r'(?<!\\)(?:\\\\)*(%)')
+
+
+def strip_comment(line):
+    """The part of one line before its first unescaped %."""
+    comment = COMMENT_PATTERN.search(line)
+    return line[:comment.start(1)] if comment else line
+
+
+class InvalidLatexStream(Exception):
+    """Raised as soon as streamed output can no longer become a valid document."""
+
+
+class LatexStreamValidator:
+    """
+    Incremental checks on LaTeX arriving in chunks.
+
+    The output must start with \\documentclass (after an optional ```latex
+    fence and comment lines), and every \\end{...} must close the most
+    recently opened environment. Violations raise InvalidLatexStream
+    immediately so the caller can abort the generation.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.stack = []
+        self._started = False
+        self._scan_from = 0
+
+    def _body_start(self):
+        """
+        Offset where \\documentclass should appear, skipping a ```latex fence and
+        leading comment lines; None while such a line is still arriving.
+        """
+        start = 0
+        while True:
+            rest = self.text[start:]
+            start += len(rest) - len(rest.lstrip())
+            if not self.text.startswith(('`', '%'), start):
+                return start
+            newline = self.text.find('\n', start)
+            if newline == -1:
+                return None
+            start = newline + 1
+
+    def feed(self, chunk):
+        self.text += chunk or ""
+
+        if not self._started:
+            start = self._body_start()
+            if start is None:
+                return
+            head = self.text[start:start + len(DOCUMENT_START)]
+            if not DOCUMENT_START.startswith(head):
+                raise InvalidLatexStream(f"Output does not start with {DOCUMENT_START}: {head!r}")
+            if len(head) < len(DOCUMENT_START):
+                return
+            self._started = True
+            self._scan_from = start
+
+        self._scan(self.text.rfind('\n') + 1)
+
+    def _scan(self, end):
+        """
+        Check environments on the complete lines up to `end`. Lines are only
+        scanned once whole, so a token split across chunks is seen intact and
+        a commented-out \\begin/\\end is never counted.
+        """
+        for line in self.text[self._scan_from:end].splitlines():
+            for match in ENVIRONMENT_PATTERN.finditer(strip_comment(line)):
+                kind, name = match.group(1), match.group(2).strip()
+                if kind == 'begin':
+                    self.stack.append(name)
+                elif not self.stack or self.stack[-1] != name:
+                    expected = self.stack[-1] if self.stack else "nothing"
+                    raise InvalidLatexStream(f"\\end{{{name}}} found while {expected} is open")
+                else:
+                    self.stack.pop()
+        self._scan_from = max(self._scan_from, end)
+
+    def finish(self):
+        """Final checks once the stream has ended; returns the full text."""
+        if not self._started:
+            raise InvalidLatexStream("Output ended before \\documentclass")
+        self._scan(len(self.text))
+        if '\\end{document}' not in self.text:
+            raise InvalidLatexStream("Output is missing \\end{document}")
+        if self.stack:
+            raise InvalidLatexStream(f"Unclosed environments: {', '.join(self.stack)}")
+        return self.text
+
+
+def generate_latex_streaming(model, prompt, max_attempts=GEMINI_MAX_ATTEMPTS):
+    """
+    Stream a LaTeX document from a Gemini model, validating as it arrives.
+
+    A generation that goes wrong is abandoned at the first bad chunk and
+    retried, up to `max_attempts` in total. Returns (text, attempts).
+    """
+    last_error = None
+    for attempt in range(1, max(1, max_attempts) + 1):
+        validator = LatexStreamValidator()
+        try:
+            for chunk in model.generate_content(prompt, stream=True):
+                validator.feed(chunk.text)
+            return validator.finish(), attempt
+        except InvalidLatexStream as e:
+            print(f"Aborted LaTeX generation on attempt {attempt}: {str(e)}")
+            last_error = e
+    raise last_error
@@ -0,0 +1,165 @@
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+from llama_cpp import Llama
+
+
+class LlamaPool:
+    """
+    Process-wide pool of llama.cpp instances sharing one mmap'd GGUF file.
+
+    Instances are created lazily on first demand, up to `size`, and handed out
+    to callers one at a time. Load time and queue-wait time are recorded so
+    they can be exposed through the metrics endpoint.
+    """
+
+    def __init__(self, model_path, size=1, **model_kwargs):
+        self.model_path = model_path
+        self.size = max(1, int(size))
+        self.model_kwargs = dict(model_kwargs)
+        self.model_kwargs.setdefault("use_mmap", True)
+
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._in_use = 0
+
+        self._loads = 0
+        self._load_seconds_total = 0.0
+        self._load_seconds_last = 0.0
+        self._acquires = 0
+        self._wait_seconds_total = 0.0
+        self._wait_seconds_max = 0.0
+
+    def _load(self):
+        start = time.perf_counter()
+        llm = Llama(model_path=self.model_path, verbose=False, **self.model_kwargs)
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            self._loads += 1
+            self._load_seconds_total += elapsed
+            self._load_seconds_last = elapsed
+        print(f"Loaded {self.model_path} (n_ctx={self.model_kwargs.get('n_ctx')}) in {elapsed:.2f}s")
+        return llm
+
+    def _checkout(self, timeout):
+        # Reuse an idle instance if there is one
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        # Otherwise grow the pool if we are still below its size
+        with self._lock:
+            can_grow = self._created < self.size
+            if can_grow:
+                self._created += 1
+        if can_grow:
+            try:
+                return self._load()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        # Pool is full, wait for another request to give one back
+        try:
+            return self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError(f"Timed out after {timeout}s waiting for a model instance")
+
+    @contextmanager
+    def acquire(self, timeout=None):
+        """Borrow a model instance for the duration of the `with` block."""
+        start = time.perf_counter()
+        llm = self._checkout(timeout)
+        waited = time.perf_counter() - start
+
+        with self._lock:
+            self._acquires += 1
+            self._in_use += 1
+            self._wait_seconds_total += waited
+            self._wait_seconds_max = max(self._wait_seconds_max, waited)
+
+        try:
+            yield llm
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            self._idle.put(llm)
+
+    def metrics(self):
+        with self._lock:
+            return {
+                "model_path": self.model_path,
+                "n_ctx": self.model_kwargs.get("n_ctx"),
+                "pool_size": self.size,
+                "instances_loaded": self._created,
+                "instances_in_use": self._in_use,
+                "loads": self._loads,
+                "load_seconds_total": round(self._load_seconds_total, 4),
+                "load_seconds_last": round(self._load_seconds_last, 4),
+                "acquires": self._acquires,
+                "queue_wait_seconds_total": round(self._wait_seconds_total, 4),
+                "queue_wait_seconds_avg": round(self._wait_seconds_total / self._acquires, 4) if self._acquires else 0.0,
+                "queue_wait_seconds_max": round(self._wait_seconds_max, 4),
+            }
+
+
+# Configuration for the process-wide pools
+POOL_SIZE = int(os.environ.get("LLAMA_POOL_SIZE", "1"))
+ACQUIRE_TIMEOUT = float(os.environ.get("LLAMA_ACQUIRE_TIMEOUT", "120"))
+
+# One pool per context size, so right-sized KV caches are reused across requests
+_pools = {}
+_pool_lock = threading.Lock()
+
+_tokenizers = {}
+_tokenizer_lock = threading.Lock()
+
+
+def get_pool(model_path, **model_kwargs):
+    """Return the shared pool for this model and context size, creating it on first use."""
+    key = (model_path, model_kwargs.get("n_ctx"))
+    pool = _pools.get(key)
+    if pool is None:
+        with _pool_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = LlamaPool(model_path, size=POOL_SIZE, **model_kwargs)
+                _pools[key] = pool
+    return pool
+
+
+def count_tokens(model_path, text):
+    """
+    Count prompt tokens using a vocab-only instance of the model.
+
+    The vocab-only load skips the weights and KV cache, so it is cheap enough
+    to keep around just for sizing requests.
+    """
+    with _tokenizer_lock:
+        tokenizer = _tokenizers.get(model_path)
+        if tokenizer is None:
+            tokenizer = Llama(model_path=model_path, vocab_only=True, verbose=False)
+            _tokenizers[model_path] = tokenizer
+        return len(tokenizer.tokenize(text.encode("utf-8"), add_bos=True))
+
+
+def pick_context_bucket(n_tokens, buckets, default=None):
+    """Smallest bucket that holds `n_tokens`, or `default` if none is large enough."""
+    for bucket in sorted(buckets):
+        if n_tokens <= bucket:
+            return bucket
+    return default
+
+
+def get_metrics():
+    """Metrics for every pool that has been created, keyed by context size."""
+    with _pool_lock:
+        pools = list(_pools.values())
+    return {str(pool.model_kwargs.get("n_ctx")): pool.metrics() for pool in pools}
@@ -0,0 +1,159 @@
+import contextlib
+import fcntl
+import hashlib
+import os
+import tempfile
+import threading
+
+# On-disk cache of compiled PDFs keyed by the SHA-256 of the LaTeX source
+PDF_CACHE_DIR = os.environ.get("PDF_CACHE_DIR", os.path.join(tempfile.gettempdir(), "resume_pdf_cache"))
+PDF_CACHE_MAX_BYTES = int(os.environ.get("PDF_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# Bump when compiler settings change in a way that alters the PDF for the same source
+PDF_CACHE_VERSION = "1"
+
+LOCK_FILE = ".lock"
+
+
+def source_key(latex_code):
+    """Content address of a LaTeX source."""
+    digest = hashlib.sha256(PDF_CACHE_VERSION.encode('utf-8'))
+    digest.update(latex_code.encode('utf-8'))
+    return digest.hexdigest()
+
+
+class PdfCache:
+    """
+    Size-bounded LRU cache of compiled PDFs on disk.
+
+    Entries are `<sha256>.pdf` files, optionally with the `<sha256>.tex`
+    source next to them so clients can fetch the LaTeX by the same ID.
+    The directory is the only state: every worker process sees entries
+    written by the others, recency is the file mtime (touched on each hit),
+    and eviction scans the directory under a file lock, so `max_bytes`
+    bounds the disk usage of all workers together.
+    """
+
+    def __init__(self, cache_dir=PDF_CACHE_DIR, max_bytes=PDF_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def path_for(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pdf")
+
+    def tex_path_for(self, key):
+        return os.path.join(self.cache_dir, f"{key}.tex")
+
+    def contains(self, key):
+        return os.path.exists(self.path_for(key))
+
+    def _scan(self):
+        """(mtime, key, size) of every entry, oldest first; size includes the .tex file."""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.pdf'):
+                continue
+            key = name[:-4]
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                continue
+            size = stat.st_size
+            try:
+                size += os.path.getsize(self.tex_path_for(key))
+            except OSError:
+                pass
+            entries.append((stat.st_mtime, key, size))
+        return sorted(entries)
+
+    @contextlib.contextmanager
+    def _dir_lock(self):
+        with self._lock, open(os.path.join(self.cache_dir, LOCK_FILE), 'w') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def get_latex(self, key):
+        """Return the LaTeX source stored with `key`, or None."""
+        try:
+            with open(self.tex_path_for(key), 'r', encoding='utf-8') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def get(self, key):
+        """Return the cached PDF bytes for `key`, or None on a miss."""
+        try:
+            with open(self.path_for(key), 'rb') as f:
+                data = f.read()
+            os.utime(self.path_for(key))
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def _write_atomic(self, path, data):
+        # Readers never see a partially written file
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def put(self, key, pdf_data, latex_code=None):
+        """Store a PDF (and its source); returns False if it is larger than the whole cache."""
+        latex_data = latex_code.encode('utf-8') if latex_code is not None else b''
+        if len(pdf_data) + len(latex_data) > self.max_bytes:
+            return False
+
+        if latex_code is not None:
+            self._write_atomic(self.tex_path_for(key), latex_data)
+        self._write_atomic(self.path_for(key), pdf_data)
+
+        with self._dir_lock():
+            entries = self._scan()
+            total = sum(size for _, _, size in entries)
+            for _, old_key, size in entries:
+                if total <= self.max_bytes:
+                    break
+                if old_key == key:
+                    continue
+                for path in (self.path_for(old_key), self.tex_path_for(old_key)):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                total -= size
+                self.evictions += 1
+        return True
+
+    def metrics(self):
+        entries = self._scan()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "cache_dir": self.cache_dir,
+                "entries": len(entries),
+                "bytes": sum(size for _, _, size in entries),
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+pdf_cache = PdfCache() if PDF_CACHE_MAX_BYTES > 0 else None
+
+
+def get_metrics():
+    return pdf_cache.metrics() if pdf_cache else {}
@@ -0,0 +1,120 @@
+import json
+import math
+import os
+import re
+
+# Compact prompt serialization for Gemini
+PROMPT_COMPACTION = os.environ.get("PROMPT_COMPACTION", "1") == "1"
+GEMINI_PROMPT_TOKEN_BUDGET = int(os.environ.get("GEMINI_PROMPT_TOKEN_BUDGET", "0"))
+GEMINI_COUNT_TOKENS = os.environ.get("GEMINI_COUNT_TOKENS", "0") == "1"
+
+# Placeholder values the frontend and the PDF parser use for "no data"
+EMPTY_VALUES = {"", "na", "n/a", "none", "null", "undefined", "-"}
+
+# Database bookkeeping that never belongs in a resume
+IGNORED_KEYS = {"_id", "__v", "userId", "createdAt", "updatedAt", "profilePhoto", "password"}
+
+# Template sections and the profile/resume keys (normalized) that feed them
+OPTIONAL_SECTIONS = {
+    "Work Experience": ("workexperience",),
+    "Projects": ("projects",),
+    "Courses": ("courses", "certificationscourses"),
+}
+
+TRAILING_COMMENT_PATTERN = re.compile(r'(?<=\s)(?<!\\)%\s+\S.*$')
+
+
+def compact(value):
+    """Recursively drop nulls, empty strings, NA placeholders and empty containers."""
+    if isinstance(value, dict):
+        result = {}
+        for key, item in value.items():
+            if key in IGNORED_KEYS:
+                continue
+            item = compact(item)
+            if item is not None:
+                result[key] = item
+        return result or None
+    if isinstance(value, (list, tuple)):
+        result = [item for item in (compact(item) for item in value) if item is not None]
+        return result or None
+    if isinstance(value, str):
+        value = value.strip()
+        return None if value.lower() in EMPTY_VALUES else value
+    return value
+
+
+def to_prompt_json(value, empty_text):
+    """Minified JSON of the compacted value, or `empty_text` if nothing is left."""
+    value = compact(value)
+    if value is None:
+        return empty_text
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False)
+
+
+def _normalize_key(key):
+    return key.replace('_', '').lower()
+
+
+def present_sections(*sources):
+    """Names of optional template sections that have data in any of the sources."""
+    keys = set()
+    for source in sources:
+        source = compact(source)
+        if isinstance(source, dict):
+            keys.update(_normalize_key(key) for key in source)
+    return {name for name, section_keys in OPTIONAL_SECTIONS.items() if keys.intersection(section_keys)}
+
+
+def strip_latex_comments(latex_code):
+    """
+    Remove comment-only lines, spaced trailing comments and repeated blank
+    lines. Line-ending `%` used to suppress whitespace is kept, so the
+    typeset output does not change.
+    """
+    lines = []
+    for line in latex_code.splitlines():
+        if line.lstrip().startswith('%'):
+            continue
+        line = TRAILING_COMMENT_PATTERN.sub('', line).rstrip()
+        if not line and (not lines or not lines[-1]):
+            continue
+        lines.append(line)
+    return "\n".join(lines).strip() + "\n"
+
+
+def compact_template(template, sections):
+    """Template without the optional sections missing from `sections`, and without comments."""
+    for name in OPTIONAL_SECTIONS:
+        if name in sections:
+            continue
+        template = re.sub(
+            r'^(?:%-+[^\n]*\n)?\\section\{' + re.escape(name) + r'\}.*?(?=^%-+|^\\section|^\\end\{document\})',
+            '', template, flags=re.S | re.M
+        )
+    return strip_latex_comments(template)
+
+
+def estimate_tokens(text):
+    """Rough token count (about four characters per token) that needs no API call."""
+    return math.ceil(len(text) / 4)
+
+
+def prompt_stats(prompt, model=None, budget=GEMINI_PROMPT_TOKEN_BUDGET):
+    """
+    Size report for one prompt. With GEMINI_COUNT_TOKENS=1 the exact count is
+    fetched from the model's count_tokens endpoint, otherwise it is estimated.
+    """
+    stats = {"chars": len(prompt), "tokens": estimate_tokens(prompt), "token_count": "estimated"}
+    if model is not None and GEMINI_COUNT_TOKENS:
+        try:
+            stats["tokens"] = model.count_tokens(prompt).total_tokens
+            stats["token_count"] = "exact"
+        except Exception as e:
+            print(f"Token count failed, using estimate: {str(e)}")
+    if budget:
+        stats["budget"] = budget
+        stats["over_budget"] = stats["tokens"] > budget
+        if stats["over_budget"]:
+            print(f"Prompt of {stats['tokens']} tokens exceeds budget of {budget}")
+    return stats
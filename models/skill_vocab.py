@@ -0,0 +1,154 @@
+import os
+import re
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+
+from skills_store import SkillsStore, SKILLS_STORE_PATH
+
+# Skills of every row pre-split into integer IDs (CSR layout), built once from the skills store.
+# A directory of .npy files, memory-mapped so worker processes share the pages:
+#   ids, offsets          row i owns ids[offsets[i]:offsets[i + 1]]
+#   names, name_offsets   UTF-8 skill names; skill j is names[name_offsets[j]:name_offsets[j + 1]]
+SKILLS_VOCAB_PATH = os.environ.get("SKILLS_VOCAB_PATH", "skills_vocab")
+VOCAB_ARRAYS = ("ids", "offsets", "names", "name_offsets")
+
+
+def split_skills(text):
+    """Splits a string of skills into a list of individual skills."""
+
+    # Remove "ex" part
+    text = re.sub(r'\bex\b', '', text, flags=re.IGNORECASE)
+
+    # Split based on capital letters and commas
+    skills = re.findall(r'[A-Z][a-z]+(?:\s+[a-z]+)*|[A-Z]+', text)
+
+    return skills
+
+
+def _add_rows(texts, vocab, ids, offsets):
+    for text in texts:
+        row_ids = []
+        for skill in split_skills(text):
+            skill_id = vocab.setdefault(skill, len(vocab))
+            if skill_id not in row_ids:
+                row_ids.append(skill_id)
+        ids.extend(row_ids)
+        offsets.append(len(ids))
+
+
+def _write_vocabulary(vocab_path, vocab, ids, offsets):
+    names = [name.encode('utf-8') for name in vocab]
+    name_offsets = np.zeros(len(names) + 1, dtype=np.int64)
+    np.cumsum([len(name) for name in names], out=name_offsets[1:])
+    arrays = {
+        "ids": np.asarray(ids, dtype=np.int32),
+        "offsets": np.asarray(offsets, dtype=np.int64),
+        "names": np.frombuffer(b"".join(names), dtype=np.uint8),
+        "name_offsets": name_offsets,
+    }
+
+    # Write a complete directory next to the destination, then swap it in
+    parent = os.path.dirname(os.path.abspath(vocab_path))
+    tmp_dir = tempfile.mkdtemp(prefix=".vocab_", dir=parent)
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_dir, f"{name}.npy"), array)
+    if os.path.isdir(vocab_path):
+        old_dir = tempfile.mkdtemp(prefix=".vocab_old_", dir=parent)
+        os.replace(vocab_path, os.path.join(old_dir, "vocab"))
+        os.replace(tmp_dir, vocab_path)
+        shutil.rmtree(old_dir, ignore_errors=True)
+    else:
+        os.replace(tmp_dir, vocab_path)
+    return len(vocab)
+
+
+def build_vocabulary(store, vocab_path=SKILLS_VOCAB_PATH):
+    """
+    Split every row's skills once and write them as integer IDs: row i owns
+    ids[offsets[i]:offsets[i + 1]], in order and without repeats, and IDs
+    index into `vocab`. Returns the vocabulary size.
+    """
+    vocab, ids, offsets = {}, [], [0]
+    _add_rows((store[row] for row in range(len(store))), vocab, ids, offsets)
+    return _write_vocabulary(vocab_path, vocab, ids, offsets)
+
+
+def extend_vocabulary(src_path, dst_path, texts):
+    """Write `dst_path` as the vocabulary at `src_path` plus rows for `texts`; existing IDs are kept."""
+    existing = SkillVocabulary(src_path)
+    vocab = {existing.name(skill_id): skill_id for skill_id in range(existing.vocabulary_size)}
+    ids, offsets = existing.ids.tolist(), existing.offsets.tolist()
+    _add_rows(texts, vocab, ids, offsets)
+    return _write_vocabulary(dst_path, vocab, ids, offsets)
+
+
+class SkillVocabulary:
+    """Pre-split skills per row, with distance-weighted aggregation over search hits."""
+
+    def __init__(self, path=SKILLS_VOCAB_PATH):
+        self.path = path
+        self.ids, self.offsets, self.names, self.name_offsets = (
+            np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r') for name in VOCAB_ARRAYS
+        )
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @property
+    def vocabulary_size(self):
+        return len(self.name_offsets) - 1
+
+    def name(self, skill_id):
+        return self.names[self.name_offsets[skill_id]:self.name_offsets[skill_id + 1]].tobytes().decode('utf-8')
+
+    def row_skills(self, row):
+        return [self.name(skill_id) for skill_id in self.ids[self.offsets[row]:self.offsets[row + 1]]]
+
+    def aggregate(self, rows, distances, limit=None):
+        """
+        Rank the skills of the hit rows by summed weight 1 / (1 + distance).
+
+        Ties keep first-seen order, so a single hit returns that row's skills
+        in their original order. Returns (skills, scores).
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        distances = np.asarray(distances, dtype=np.float64)
+        valid = (rows >= 0) & (rows < len(self))
+        rows, distances = rows[valid], distances[valid]
+        if not len(rows):
+            return [], []
+
+        # Gather all hit rows' skill IDs without a Python loop over rows
+        starts = self.offsets[rows]
+        lengths = self.offsets[rows + 1] - starts
+        total = int(lengths.sum())
+        if not total:
+            return [], []
+        row_starts = np.repeat(starts - np.concatenate(([0], np.cumsum(lengths)[:-1])), lengths)
+        skill_ids = self.ids[row_starts + np.arange(total)]
+        weights = np.repeat(1.0 / (1.0 + np.maximum(distances, 0.0)), lengths)
+
+        unique_ids, first_seen, inverse = np.unique(skill_ids, return_index=True, return_inverse=True)
+        scores = np.bincount(inverse, weights=weights)
+        order = np.lexsort((first_seen, -scores))
+        if limit:
+            order = order[:limit]
+        return [self.name(skill_id) for skill_id in unique_ids[order]], [round(float(score), 4) for score in scores[order]]
+
+
+def open_vocabulary(store_path=SKILLS_STORE_PATH, vocab_path=SKILLS_VOCAB_PATH):
+    """Load the skill vocabulary, (re)building it if missing or older than the skills store."""
+    marker = os.path.join(vocab_path, "offsets.npy")
+    if not os.path.exists(marker) or os.path.getmtime(store_path) > os.path.getmtime(marker):
+        print(f"Building skill vocabulary {vocab_path} from {store_path}")
+        build_vocabulary(SkillsStore(store_path), vocab_path)
+    return SkillVocabulary(vocab_path)
+
+
+if __name__ == '__main__':
+    store_path = sys.argv[1] if len(sys.argv) > 1 else SKILLS_STORE_PATH
+    vocab_path = sys.argv[2] if len(sys.argv) > 2 else SKILLS_VOCAB_PATH
+    print(f"Wrote {build_vocabulary(SkillsStore(store_path), vocab_path)} skills to {vocab_path}")
@@ -0,0 +1,154 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Persistent cache location and size limit
+SKILLS_CACHE_PATH = os.environ.get("SKILLS_CACHE_PATH", "skills_cache.sqlite3")
+SKILLS_CACHE_MAX_ENTRIES = int(os.environ.get("SKILLS_CACHE_MAX_ENTRIES", "10000"))
+
+KEY_FIELDS = ('job_title', 'job_role', 'job_description', 'responsibilities')
+
+
+def model_file_hash(path):
+    """
+    SHA-256 of the model file. Hashing a multi-GB GGUF file takes a while,
+    so the digest is kept in a `<path>.sha256` sidecar and only recomputed
+    when the file's size or mtime changes. Call this at startup, not per request.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return "missing"
+
+    sidecar = f"{path}.sha256"
+    fingerprint = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    try:
+        with open(sidecar) as f:
+            saved = json.load(f)
+        if saved.get("size") == stat.st_size and saved.get("mtime_ns") == stat.st_mtime_ns:
+            return saved["sha256"]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    sha256 = digest.hexdigest()
+
+    tmp_path = f"{sidecar}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'w') as f:
+            json.dump({**fingerprint, "sha256": sha256}, f)
+        os.replace(tmp_path, sidecar)
+    except OSError as e:
+        print(f"Could not save model hash to {sidecar}: {str(e)}")
+    return sha256
+
+
+def normalize_field(value):
+    """Collapse case and whitespace so cosmetic edits map to the same key."""
+    if isinstance(value, (list, tuple)):
+        value = " ".join(str(item) for item in value)
+    return " ".join(str(value or "").lower().split())
+
+
+def job_cache_key(job_description, model_hash):
+    """Content hash of the normalized job description fields plus the model hash."""
+    normalized = {field: normalize_field(job_description.get(field)) for field in KEY_FIELDS}
+    payload = json.dumps({"job": normalized, "model": model_hash}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class SkillsCache:
+    """SQLite-backed LRU cache mapping job description hashes to extracted skills."""
+
+    def __init__(self, path=SKILLS_CACHE_PATH, max_entries=SKILLS_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        with self._connect() as conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS skills_cache (
+                    key TEXT PRIMARY KEY,
+                    skills TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS skills_cache_last_used ON skills_cache (last_used)")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def get(self, key):
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT skills FROM skills_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            conn.execute("UPDATE skills_cache SET last_used = ? WHERE key = ?", (time.time(), key))
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, skills):
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO skills_cache (key, skills, created_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, skills, now, now)
+            )
+            # Evict least recently used rows beyond the size limit
+            count = conn.execute("SELECT COUNT(*) FROM skills_cache").fetchone()[0]
+            overflow = count - self.max_entries
+            if overflow > 0:
+                conn.execute(
+                    "DELETE FROM skills_cache WHERE key IN "
+                    "(SELECT key FROM skills_cache ORDER BY last_used ASC LIMIT ?)",
+                    (overflow,)
+                )
+                self.evictions += overflow
+
+    def metrics(self):
+        with self._lock, self._connect() as conn:
+            entries = conn.execute("SELECT COUNT(*) FROM skills_cache").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "path": self.path,
+                "entries": entries,
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Return the process-wide skills cache, or None when it is disabled."""
+    global _cache
+    if SKILLS_CACHE_MAX_ENTRIES <= 0:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SkillsCache()
+    return _cache
+
+
+def get_metrics():
+    cache = get_cache()
+    return cache.metrics() if cache else {}
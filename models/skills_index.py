@@ -0,0 +1,446 @@
+import argparse
+import contextlib
+import csv
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+
+import faiss
+import numpy as np
+
+from skills_store import SkillsStore, build_store, append_store, write_store, SKILLS_CSV_PATH, SKILLS_STORE_PATH
+from skill_vocab import SkillVocabulary, build_vocabulary, extend_vocabulary, open_vocabulary, SKILLS_VOCAB_PATH
+
+# Versioned skills index artifacts: <root>/<version>/{index.faiss, embeddings.npy,
+# skills.bin, texts.bin, skills_vocab/, manifest.json}, with <root>/CURRENT naming the live one
+SKILLS_INDEX_DIR = os.environ.get("SKILLS_INDEX_DIR", "skills_index")
+# The shipped embeddings.npy encodes each row's Role, so that is what new rows are embedded from too
+SKILLS_TEXT_COLUMNS = os.environ.get("SKILLS_TEXT_COLUMNS", "Role").split(",")
+EMBEDDING_MODEL_NAME = os.environ.get("EMBEDDING_MODEL_NAME", "all-MiniLM-L6-v2")
+EMBEDDING_BUILD_BATCH_SIZE = int(os.environ.get("EMBEDDING_BUILD_BATCH_SIZE", "64"))
+# Index structure: exact "flat", or approximate "ivfpq" / "hnsw" for large corpora
+SKILLS_INDEX_TYPE = os.environ.get("SKILLS_INDEX_TYPE", "flat")
+INDEX_TYPES = ("flat", "ivfpq", "hnsw")
+# Build parameters; IVF lists default to about 4 * sqrt(rows)
+SKILLS_IVF_NLIST = int(os.environ.get("SKILLS_IVF_NLIST", "0"))
+SKILLS_PQ_M = int(os.environ.get("SKILLS_PQ_M", "48"))
+SKILLS_PQ_BITS = int(os.environ.get("SKILLS_PQ_BITS", "8"))
+SKILLS_HNSW_M = int(os.environ.get("SKILLS_HNSW_M", "32"))
+SKILLS_HNSW_EF_CONSTRUCTION = int(os.environ.get("SKILLS_HNSW_EF_CONSTRUCTION", "200"))
+# Search-time recall/latency knobs, applied when an index is loaded
+SKILLS_NPROBE = int(os.environ.get("SKILLS_NPROBE", "16"))
+SKILLS_EF_SEARCH = int(os.environ.get("SKILLS_EF_SEARCH", "64"))
+# Parent rows re-embedded before an ingest, and how close they must stay to the stored vectors
+SKILLS_INGEST_CHECK_ROWS = int(os.environ.get("SKILLS_INGEST_CHECK_ROWS", "8"))
+SKILLS_INGEST_MIN_SIMILARITY = float(os.environ.get("SKILLS_INGEST_MIN_SIMILARITY", "0.999"))
+# Old versions kept after a publish, for rollback and for workers still reading them
+SKILLS_INDEX_KEEP_VERSIONS = int(os.environ.get("SKILLS_INDEX_KEEP_VERSIONS", "3"))
+
+# Files shipped before versioned artifacts existed, used when there is no CURRENT
+LEGACY_INDEX_PATH = "faiss_index.bin"
+LEGACY_EMBEDDINGS_PATH = "embeddings.npy"
+
+CURRENT_FILE = "CURRENT"
+LOCK_FILE = ".lock"
+MANIFEST_FILE = "manifest.json"
+INDEX_FILE = "index.faiss"
+EMBEDDINGS_FILE = "embeddings.npy"
+STORE_FILE = "skills.bin"
+# The text embedded for each row, in the skills store format
+TEXTS_FILE = "texts.bin"
+VOCAB_FILE = "skills_vocab"
+# 2: the vocabulary is a directory of memory-mappable .npy files instead of one .npz
+# 3: texts.bin records the embedded text of every row
+ARTIFACT_FORMAT = 3
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def row_text(row, text_columns):
+    """The text embedded for a row: the given columns joined by spaces."""
+    return " ".join(str(row.get(column) or "").strip() for column in text_columns).strip()
+
+
+def read_rows(csv_path):
+    csv.field_size_limit(sys.maxsize)
+    with open(csv_path, newline='', encoding='utf-8') as f:
+        return list(csv.DictReader(f))
+
+
+def read_texts(csv_path, text_columns):
+    return [row_text(row, text_columns) for row in read_rows(csv_path)]
+
+
+def embed_texts(texts, model_name=EMBEDDING_MODEL_NAME, batch_size=EMBEDDING_BUILD_BATCH_SIZE, model=None):
+    if model is None:
+        from sentence_transformers import SentenceTransformer
+        model = SentenceTransformer(model_name)
+    return model.encode(texts, batch_size=batch_size, show_progress_bar=len(texts) > batch_size).astype('float32')
+
+
+def read_index(path):
+    """Read a FAISS index memory-mapped where the index type supports it."""
+    try:
+        return faiss.read_index(path, faiss.IO_FLAG_MMAP)
+    except RuntimeError as e:
+        print(f"Memory-mapped FAISS load failed, reading into memory: {str(e)}")
+        return faiss.read_index(path)
+
+
+def default_nlist(rows):
+    """About 4 * sqrt(rows) lists, but at least 39 training points per list as FAISS recommends."""
+    return max(1, min(int(4 * rows ** 0.5), rows // 39))
+
+
+def make_index(embeddings, index_type=SKILLS_INDEX_TYPE, nlist=SKILLS_IVF_NLIST, pq_m=SKILLS_PQ_M,
+               pq_bits=SKILLS_PQ_BITS, hnsw_m=SKILLS_HNSW_M, ef_construction=SKILLS_HNSW_EF_CONSTRUCTION):
+    """
+    Build an index of `index_type` over `embeddings`, wrapped in an
+    IndexIDMap2 with row numbers as IDs. Returns (index, params), where
+    params are the build parameters recorded in the manifest.
+    """
+    dimension = embeddings.shape[1]
+    if index_type == "flat":
+        inner, params = faiss.IndexFlatL2(dimension), {}
+    elif index_type == "ivfpq":
+        nlist = nlist or default_nlist(len(embeddings))
+        if dimension % pq_m:
+            raise ValueError(f"PQ sub-quantizers ({pq_m}) must divide the dimension ({dimension})")
+        inner = faiss.IndexIVFPQ(faiss.IndexFlatL2(dimension), dimension, nlist, pq_m, pq_bits)
+        inner.train(embeddings)
+        params = {"nlist": nlist, "pq_m": pq_m, "pq_bits": pq_bits}
+    elif index_type == "hnsw":
+        inner = faiss.IndexHNSWFlat(dimension, hnsw_m)
+        inner.hnsw.efConstruction = ef_construction
+        params = {"hnsw_m": hnsw_m, "ef_construction": ef_construction}
+    else:
+        raise ValueError(f"Unknown index type {index_type!r}; expected one of {', '.join(INDEX_TYPES)}")
+
+    index = faiss.IndexIDMap2(inner)
+    index.add_with_ids(embeddings, np.arange(len(embeddings), dtype='int64'))
+    return index, params
+
+
+def configure_search(index, nprobe=SKILLS_NPROBE, ef_search=SKILLS_EF_SEARCH):
+    """Apply nprobe (IVF) or efSearch (HNSW) to an index, looking through an ID map."""
+    inner = faiss.downcast_index(index.index) if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)) else index
+    if isinstance(inner, faiss.IndexIVF):
+        inner.nprobe = nprobe
+    elif isinstance(inner, faiss.IndexHNSW):
+        inner.hnsw.efSearch = ef_search
+    return index
+
+
+def new_version():
+    return time.strftime("%Y%m%d-%H%M%S") + f"-{time.time_ns() % 10**9:09d}-{os.getpid()}"
+
+
+def current_version(root=SKILLS_INDEX_DIR):
+    """Name of the live artifact version, or None if none has been published."""
+    try:
+        with open(os.path.join(root, CURRENT_FILE)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def publish(root, version):
+    """Point CURRENT at `version`; readers see either the old or the new name, never a mix."""
+    tmp_path = os.path.join(root, f"{CURRENT_FILE}.{os.getpid()}.tmp")
+    with open(tmp_path, 'w') as f:
+        f.write(version + "\n")
+    os.replace(tmp_path, os.path.join(root, CURRENT_FILE))
+
+
+def write_manifest(version_dir, manifest):
+    with open(os.path.join(version_dir, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+
+def read_manifest(version_dir):
+    with open(os.path.join(version_dir, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    if manifest.get("format") != ARTIFACT_FORMAT:
+        raise ValueError(
+            f"{version_dir} has artifact format {manifest.get('format')}, expected {ARTIFACT_FORMAT}; "
+            "rebuild it with 'python skills_index.py build'"
+        )
+    return manifest
+
+
+def build_artifact(csv_path=SKILLS_CSV_PATH, root=SKILLS_INDEX_DIR, text_columns=SKILLS_TEXT_COLUMNS,
+                   embeddings_path=None, model_name=EMBEDDING_MODEL_NAME, activate=True,
+                   index_type=SKILLS_INDEX_TYPE, **index_params):
+    """
+    Build a complete artifact from a CSV into a new version directory.
+
+    Rows are embedded with `model_name`, unless `embeddings_path` points at
+    precomputed embeddings with one row per CSV row. Skills are split into
+    the integer vocabulary here, so queries never run the splitting regexes.
+    `index_type` and `index_params` are passed to make_index. Returns the
+    version name.
+    """
+    texts = read_texts(csv_path, text_columns)
+    if embeddings_path:
+        embeddings = np.load(embeddings_path).astype('float32')
+        if embeddings.shape[0] != len(texts):
+            raise ValueError(f"{embeddings_path} has {embeddings.shape[0]} rows, {csv_path} has {len(texts)}")
+    else:
+        embeddings = embed_texts(texts, model_name)
+
+    with writer_lock(root):
+        version = new_version()
+        version_dir = os.path.join(root, version)
+        os.makedirs(version_dir)
+        _write_artifact(
+            version_dir, version, csv_path, texts, embeddings, text_columns, model_name, index_type, index_params
+        )
+        if activate:
+            publish(root, version)
+    return version
+
+
+def _write_artifact(version_dir, version, csv_path, texts, embeddings, text_columns, model_name,
+                    index_type, index_params):
+    # Row numbers are the vector IDs, so rows can be appended later without a rebuild
+    index, params = make_index(embeddings, index_type, **index_params)
+    faiss.write_index(index, os.path.join(version_dir, INDEX_FILE))
+    np.save(os.path.join(version_dir, EMBEDDINGS_FILE), embeddings)
+
+    write_store(os.path.join(version_dir, TEXTS_FILE), texts)
+    store_path = os.path.join(version_dir, STORE_FILE)
+    build_store(csv_path, store_path)
+    vocab_size = build_vocabulary(SkillsStore(store_path), os.path.join(version_dir, VOCAB_FILE))
+
+    write_manifest(version_dir, {
+        "format": ARTIFACT_FORMAT,
+        "version": version,
+        "created_at": time.time(),
+        "rows": len(texts),
+        "dimension": int(embeddings.shape[1]),
+        "vocabulary_size": vocab_size,
+        "model": model_name,
+        "text_columns": list(text_columns),
+        "index_type": index_type,
+        "index_params": params,
+        "source": {"path": os.path.abspath(csv_path), "sha256": file_sha256(csv_path)},
+    })
+
+
+@contextlib.contextmanager
+def writer_lock(root):
+    """Serialize builds and ingests that publish into the same root, across processes."""
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, LOCK_FILE), 'w') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def as_id_map(index):
+    """The index wrapped in an IndexIDMap2 keyed by row number, copying vectors if needed."""
+    if isinstance(index, faiss.IndexIDMap2):
+        return index
+    vectors = index.reconstruct_n(0, index.ntotal)
+    wrapped = faiss.IndexIDMap2(faiss.IndexFlatL2(index.d))
+    wrapped.add_with_ids(vectors, np.arange(index.ntotal, dtype='int64'))
+    return wrapped
+
+
+def prune_versions(root, keep=SKILLS_INDEX_KEEP_VERSIONS):
+    """Delete all but the newest `keep` versions besides the current one."""
+    current = current_version(root)
+    versions = sorted(
+        name for name in os.listdir(root)
+        if name != current and os.path.isfile(os.path.join(root, name, MANIFEST_FILE))
+    )
+    for name in versions[:max(0, len(versions) - keep)]:
+        shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+
+def check_embeddings(version_dir, model, rows=SKILLS_INGEST_CHECK_ROWS):
+    """
+    Re-embed a sample of an artifact's rows and compare them with its stored
+    vectors. Raises ValueError when they differ, since rows embedded now
+    would not be comparable with the rest of the index.
+    """
+    texts = SkillsStore(os.path.join(version_dir, TEXTS_FILE))
+    try:
+        sample = np.unique(np.linspace(0, len(texts) - 1, min(max(1, rows), len(texts))).astype('int64'))
+        sample_texts = [texts[int(row)] for row in sample]
+    finally:
+        texts.close()
+
+    stored = np.load(os.path.join(version_dir, EMBEDDINGS_FILE), mmap_mode='r')[sample]
+    fresh = embed_texts(sample_texts, model=model)
+    similarity = np.sum(stored * fresh, axis=1) / (
+        np.linalg.norm(stored, axis=1) * np.linalg.norm(fresh, axis=1) + 1e-12
+    )
+    if similarity.min() < SKILLS_INGEST_MIN_SIMILARITY:
+        row = int(sample[int(np.argmin(similarity))])
+        raise ValueError(
+            f"Re-embedding row {row} of {version_dir} gives cosine similarity {similarity.min():.4f} to the "
+            f"stored vector; the model or text columns no longer match the index, rebuild it before ingesting"
+        )
+
+
+def ingest_rows(rows, root=SKILLS_INDEX_DIR, model=None, batch_size=EMBEDDING_BUILD_BATCH_SIZE):
+    """
+    Append job postings to the current artifact without a full rebuild.
+
+    `rows` are dicts with the CSV columns (the manifest's text columns and
+    `skills`). A few parent rows are re-embedded first, and the ingest is
+    refused if they no longer match the stored vectors. Only the new rows are
+    embedded, in batches; the index, the embeddings, the texts, the skills
+    store and the vocabulary are copied into a new version with the rows
+    appended, which is then published. Running workers pick it up on their
+    next reload check. Returns the new version name.
+    """
+    if not rows:
+        raise ValueError("No rows to ingest")
+
+    with writer_lock(root):
+        parent = current_version(root)
+        if not parent:
+            raise ValueError(f"No published skills index in {root}; run 'python skills_index.py build' first")
+        parent_dir = os.path.join(root, parent)
+        manifest = read_manifest(parent_dir)
+
+        if model is None:
+            from sentence_transformers import SentenceTransformer
+            model = SentenceTransformer(manifest["model"])
+        check_embeddings(parent_dir, model)
+
+        texts = [row_text(row, manifest["text_columns"]) for row in rows]
+        skills = [str(row.get("skills") or "") for row in rows]
+        embeddings = embed_texts(texts, manifest["model"], batch_size, model)
+
+        index = as_id_map(faiss.read_index(os.path.join(parent_dir, INDEX_FILE)))
+        start = manifest["rows"]
+        if embeddings.shape[1] != index.d:
+            raise ValueError(f"Embedding dimension {embeddings.shape[1]} does not match index dimension {index.d}")
+        index.add_with_ids(embeddings, np.arange(start, start + len(rows), dtype='int64'))
+
+        version = new_version()
+        version_dir = os.path.join(root, version)
+        os.makedirs(version_dir)
+        faiss.write_index(index, os.path.join(version_dir, INDEX_FILE))
+        np.save(
+            os.path.join(version_dir, EMBEDDINGS_FILE),
+            np.concatenate([np.load(os.path.join(parent_dir, EMBEDDINGS_FILE)), embeddings])
+        )
+        append_store(os.path.join(parent_dir, STORE_FILE), os.path.join(version_dir, STORE_FILE), skills)
+        append_store(os.path.join(parent_dir, TEXTS_FILE), os.path.join(version_dir, TEXTS_FILE), texts)
+        vocab_size = extend_vocabulary(
+            os.path.join(parent_dir, VOCAB_FILE), os.path.join(version_dir, VOCAB_FILE), skills
+        )
+
+        write_manifest(version_dir, {
+            **manifest,
+            "version": version,
+            "parent": parent,
+            "created_at": time.time(),
+            "rows": start + len(rows),
+            "ingested_rows": len(rows),
+            "vocabulary_size": vocab_size,
+        })
+        publish(root, version)
+        prune_versions(root)
+        return version
+
+
+class SkillsIndex:
+    """One loaded artifact: the FAISS index and the pre-split skills of its rows."""
+
+    def __init__(self, index, vocabulary, version=None, manifest=None):
+        self.index = index
+        self.vocabulary = vocabulary
+        self.version = version
+        self.manifest = manifest or {}
+
+    def search(self, query_embedding, k, limit=None):
+        """Skills of the k nearest rows, merged by distance; returns (skills, scores)."""
+        distances, indices = self.index.search(query_embedding, k)
+        return self.vocabulary.aggregate(indices[0], distances[0], limit)
+
+
+def load_index(root=SKILLS_INDEX_DIR):
+    """
+    Load the artifact CURRENT points at, or fall back to the legacy
+    faiss_index.bin plus a skills store and vocabulary derived from train.csv.
+    """
+    version = current_version(root)
+    if version:
+        version_dir = os.path.join(root, version)
+        manifest = read_manifest(version_dir)
+        return SkillsIndex(
+            configure_search(read_index(os.path.join(version_dir, INDEX_FILE))),
+            SkillVocabulary(os.path.join(version_dir, VOCAB_FILE)),
+            version,
+            manifest,
+        )
+
+    from skills_store import open_store
+    store = open_store(SKILLS_CSV_PATH, SKILLS_STORE_PATH)
+    return SkillsIndex(
+        configure_search(read_index(LEGACY_INDEX_PATH)), open_vocabulary(store.path, SKILLS_VOCAB_PATH)
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build versioned skills index artifacts")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build = subparsers.add_parser("build", help="Build a new artifact from a CSV and make it current")
+    build.add_argument("--csv", default=SKILLS_CSV_PATH)
+    build.add_argument("--out", default=SKILLS_INDEX_DIR)
+    build.add_argument("--text-columns",
+                       help="Comma-separated CSV columns embedded for each row (default: "
+                            f"{','.join(SKILLS_TEXT_COLUMNS)}); required with --embeddings")
+    build.add_argument("--embeddings", help="Reuse precomputed embeddings (.npy) instead of embedding the CSV")
+    build.add_argument("--model", default=EMBEDDING_MODEL_NAME)
+    build.add_argument("--no-activate", action="store_true", help="Build without updating CURRENT")
+    build.add_argument("--index-type", choices=INDEX_TYPES, default=SKILLS_INDEX_TYPE)
+    build.add_argument("--nlist", type=int, default=SKILLS_IVF_NLIST, help="IVF lists (0 picks from row count)")
+    build.add_argument("--pq-m", type=int, default=SKILLS_PQ_M, help="PQ sub-quantizers; must divide the dimension")
+    build.add_argument("--pq-bits", type=int, default=SKILLS_PQ_BITS)
+    build.add_argument("--hnsw-m", type=int, default=SKILLS_HNSW_M)
+    build.add_argument("--ef-construction", type=int, default=SKILLS_HNSW_EF_CONSTRUCTION)
+
+    ingest = subparsers.add_parser("ingest", help="Append new postings from a CSV to the current artifact")
+    ingest.add_argument("csv", help="CSV with the same columns as train.csv")
+    ingest.add_argument("--out", default=SKILLS_INDEX_DIR)
+    ingest.add_argument("--batch-size", type=int, default=EMBEDDING_BUILD_BATCH_SIZE)
+
+    args = parser.parse_args(argv)
+    if args.command == "build":
+        # Precomputed vectors cannot be checked against a default, so say what they encode
+        if args.embeddings and not args.text_columns:
+            parser.error("--text-columns is required with --embeddings")
+        text_columns = args.text_columns.split(",") if args.text_columns else SKILLS_TEXT_COLUMNS
+        version = build_artifact(
+            args.csv, args.out, text_columns, args.embeddings, args.model, not args.no_activate,
+            args.index_type, nlist=args.nlist, pq_m=args.pq_m, pq_bits=args.pq_bits, hnsw_m=args.hnsw_m,
+            ef_construction=args.ef_construction
+        )
+        print(f"Built skills index {version} in {args.out}")
+    elif args.command == "ingest":
+        rows = read_rows(args.csv)
+        version = ingest_rows(rows, args.out, batch_size=args.batch_size)
+        print(f"Ingested {len(rows)} rows into skills index {version} in {args.out}")
+
+
+if __name__ == '__main__':
+    main()
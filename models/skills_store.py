@@ -0,0 +1,116 @@
+import csv
+import mmap
+import os
+import struct
+import sys
+
+# Compact, memory-mapped copy of the skills column of train.csv
+SKILLS_CSV_PATH = os.environ.get("SKILLS_CSV_PATH", "train.csv")
+SKILLS_STORE_PATH = os.environ.get("SKILLS_STORE_PATH", "skills.bin")
+SKILLS_COLUMN = "skills"
+
+# File layout: magic, row count, (count + 1) little-endian uint64 offsets into
+# the UTF-8 blob that follows; row i is blob[offsets[i]:offsets[i + 1]]
+MAGIC = b"SKLSTOR1"
+HEADER = struct.Struct("<8sQ")
+OFFSET = struct.Struct("<Q")
+
+
+def build_store(csv_path=SKILLS_CSV_PATH, store_path=SKILLS_STORE_PATH, column=SKILLS_COLUMN):
+    """
+    Write the `column` of a CSV as an offset-indexed binary file. The file is
+    written next to its destination and renamed into place, so concurrent
+    readers never see a partial store. Returns the number of rows.
+    """
+    csv.field_size_limit(sys.maxsize)
+    values = []
+    with open(csv_path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            values.append((row.get(column) or "").encode('utf-8'))
+
+    return _write_store(store_path, [0], [], values)
+
+
+def write_store(store_path, values):
+    """Write a list of strings as a store, atomically. Returns the number of rows."""
+    return _write_store(store_path, [0], [], [(value or "").encode('utf-8') for value in values])
+
+
+def _write_store(store_path, offsets, chunks, values):
+    """Write a store from existing offsets/blob chunks plus new encoded values, atomically."""
+    offsets = list(offsets)
+    for value in values:
+        offsets.append(offsets[-1] + len(value))
+
+    tmp_path = f"{store_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(offsets) - 1))
+        f.write(struct.pack(f"<{len(offsets)}Q", *offsets))
+        for chunk in chunks:
+            f.write(chunk)
+        for value in values:
+            f.write(value)
+    os.replace(tmp_path, store_path)
+    return len(offsets) - 1
+
+
+def append_store(src_path, dst_path, values):
+    """
+    Write `dst_path` as the store at `src_path` plus new rows. Existing rows
+    are copied as raw bytes, without decoding. Returns the new row count.
+    """
+    src = SkillsStore(src_path)
+    try:
+        offsets = struct.unpack_from(f"<{len(src) + 1}Q", src._mmap, src._offsets_start)
+        blob = src._mmap[src._blob_start:src._blob_start + offsets[-1]]
+    finally:
+        src.close()
+    return _write_store(dst_path, offsets, [blob], [(value or "").encode('utf-8') for value in values])
+
+
+class SkillsStore:
+    """
+    Read-only view of a store file through mmap. Pages are shared between
+    worker processes by the OS page cache, and a row lookup is two offset
+    reads and one slice.
+    """
+
+    def __init__(self, path=SKILLS_STORE_PATH):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self._count = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a skills store")
+        self._offsets_start = HEADER.size
+        self._blob_start = self._offsets_start + (self._count + 1) * OFFSET.size
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, row):
+        if not 0 <= row < self._count:
+            raise IndexError(row)
+        position = self._offsets_start + row * OFFSET.size
+        start = OFFSET.unpack_from(self._mmap, position)[0]
+        end = OFFSET.unpack_from(self._mmap, position + OFFSET.size)[0]
+        return self._mmap[self._blob_start + start:self._blob_start + end].decode('utf-8')
+
+    def close(self):
+        self._mmap.close()
+
+
+def open_store(csv_path=SKILLS_CSV_PATH, store_path=SKILLS_STORE_PATH):
+    """Open the skills store, (re)building it first if it is missing or older than the CSV."""
+    if not os.path.exists(store_path) or (
+        os.path.exists(csv_path) and os.path.getmtime(csv_path) > os.path.getmtime(store_path)
+    ):
+        print(f"Building skills store {store_path} from {csv_path}")
+        build_store(csv_path, store_path)
+    return SkillsStore(store_path)
+
+
+if __name__ == '__main__':
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else SKILLS_CSV_PATH
+    store_path = sys.argv[2] if len(sys.argv) > 2 else SKILLS_STORE_PATH
+    print(f"Wrote {build_store(csv_path, store_path)} rows to {store_path}")